@@ -0,0 +1,135 @@
+import asyncio
+import itertools
+
+from utils import Metrics, DiskCache, Database, SearchIndex
+
+_ids = itertools.count(1)
+
+
+class FakePermissions:
+    embed_links = True
+    add_reactions = True
+    read_message_history = True
+
+
+class FakeUser:
+    def __init__(self, user_id):
+        self.id = user_id
+        self.bot = False
+
+    def __str__(self):
+        return f'user{self.id}'
+
+
+class FakeGuild:
+    def __init__(self, guild_id):
+        self.id = guild_id
+
+
+class FakeMessage:
+    def __init__(self, channel, content=None, **fields):
+        self.id = next(_ids)
+        self.channel = channel
+        self.content = content
+        self.fields = fields
+        self.edits = 0
+
+    async def edit(self, **fields):
+        self.edits += 1
+        self.channel.edits += 1
+        self.fields.update(fields)
+
+    async def delete(self):
+        pass
+
+    async def add_reaction(self, emoji):
+        pass
+
+    async def remove_reaction(self, emoji, member):
+        pass
+
+    async def clear_reactions(self):
+        pass
+
+
+class FakeChannel:
+    def __init__(self):
+        self.id = next(_ids)
+        self.sends = 0
+        self.edits = 0
+
+    def permissions_for(self, member):
+        return FakePermissions()
+
+    async def send(self, content=None, **fields):
+        self.sends += 1
+        return FakeMessage(self, content, **fields)
+
+    async def delete_messages(self, messages):
+        pass
+
+
+class FakeContext:
+    """Just enough of a commands.Context for the YouTube cog's commands."""
+
+    def __init__(self, bot, *, user_id, guild_id):
+        self.bot = bot
+        self.author = FakeUser(user_id)
+        self.guild = FakeGuild(guild_id)
+        self.channel = FakeChannel()
+        self.me = FakeUser(0)
+
+    @property
+    def session(self):
+        return self.bot.session
+
+    def responded(self):
+        pass
+
+    async def send(self, content=None, **fields):
+        return await self.channel.send(content, **fields)
+
+
+class FakePaginators:
+    """Behaves as if nobody ever reacts, so paginated commands finish right after their first page."""
+
+    def __init__(self, loop):
+        self.loop = loop
+
+    def __len__(self):
+        return 0
+
+    def wait(self, paginator, *, timeout):
+        fut = self.loop.create_future()
+        fut.set_exception(asyncio.TimeoutError())
+        return fut
+
+    def discard(self, paginator):
+        pass
+
+
+class BenchBot:
+    """Carries the attributes the YouTube cog reads off the real Bot."""
+
+    def __init__(self, loop, session, cache_path, *, quota=10**9):
+        self.loop = loop
+        self.session = session
+        self.youtube_key = 'bench'
+        self.youtube_quota = quota
+        self.guild_quota = quota
+        self.user_quota = quota
+        self.guild_weights = {}
+        self.cluster = None
+        self.metrics = Metrics()
+        self.api_store = DiskCache(cache_path)
+        self.db = Database(cache_path)
+        self.search_index = SearchIndex(cache_path)
+        self.local_search = False
+        self.paginators = FakePaginators(loop)
+        self.cogs = {}
+
+    def get_cog(self, name):
+        return self.cogs.get(name)
+
+    def add_cog(self, cog):
+        self.cogs[type(cog).__name__] = cog
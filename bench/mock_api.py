@@ -0,0 +1,182 @@
+import json
+import random
+import asyncio
+import hashlib
+from collections import Counter
+
+from aiohttp import web
+
+LOREM = ('Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor '
+         'incididunt ut labore et dolore magna aliqua. ')
+
+THUMBNAILS = {size: {'url': f'https://i.ytimg.com/vi/bench/{size}.jpg'} for size in ('default', 'medium', 'high')}
+
+
+def video_id(index):
+    return f'v{index:010d}'
+
+
+def parse_fields(text, pos=0):
+    """Turns a partial response mask like items(id,snippet/title) into nested dicts, None meaning everything."""
+
+    tree = {}
+    while pos < len(text):
+        end = pos
+        while end < len(text) and text[end] not in ',()':
+            end += 1
+
+        *parents, name = text[pos:end].split('/')
+        node = tree
+        for parent in parents:
+            node = node.setdefault(parent, {})
+
+        pos = end
+        if pos < len(text) and text[pos] == '(':
+            children, pos = parse_fields(text, pos + 1)
+            node.setdefault(name, {}).update(children)
+        else:
+            node[name] = None
+
+        if pos < len(text) and text[pos] == ')':
+            return tree, pos + 1
+        if pos < len(text) and text[pos] == ',':
+            pos += 1
+
+    return tree, pos
+
+
+def apply_fields(data, tree):
+    if tree is None:
+        return data
+    if isinstance(data, list):
+        return [apply_fields(item, tree) for item in data]
+    return {key: apply_fields(data[key], children) for key, children in tree.items() if key in data}
+
+
+class MockYouTube:
+    """A local stand-in for the parts of the YouTube Data API the bot uses."""
+
+    def __init__(self, *, latency=0.05, jitter=0.0, search_results=500, playlist_size=500,
+                 description_length=5, host='127.0.0.1', port=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.search_results = search_results
+        self.playlist_size = playlist_size
+        self.description = LOREM * description_length
+        self.host = host
+        self.port = port
+        self.calls = Counter()
+        self.bytes_sent = Counter()
+        self.not_modified = 0
+        self._runner = None
+
+        self.app = web.Application()
+        self.app.router.add_get('/youtube/v3/{route}', self.handle)
+
+    @property
+    def url(self):
+        return f'http://{self.host}:{self.port}/youtube/v3/'
+
+    async def start(self):
+        self._runner = web.AppRunner(self.app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = self._runner.addresses[0][1]
+
+    async def close(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    async def handle(self, request):
+        route = request.match_info['route']
+        builder = getattr(self, f'build_{route}', None)
+        if builder is None:
+            return web.Response(status=404)
+
+        self.calls[route] += 1
+        await asyncio.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+
+        # like the real API the ETag changes with the content, such as when a playlist grows
+        query = {k: v for k, v in request.query.items() if k != 'key'}
+        data = builder(query)
+        for item in data['items']:
+            item['etag'] = '"' + hashlib.md5(json.dumps(item, sort_keys=True).encode()).hexdigest() + '"'
+
+        if 'fields' in query:
+            data = apply_fields(data, parse_fields(query['fields'])[0])
+
+        etag = '"' + hashlib.md5(json.dumps(data, sort_keys=True).encode()).hexdigest() + '"'
+        if request.headers.get('If-None-Match') == etag:
+            self.not_modified += 1
+            return web.Response(status=304)
+
+        data['etag'] = etag
+        text = json.dumps(data)
+        self.bytes_sent[route] += len(text)
+
+        response = web.Response(text=text, content_type='application/json')
+        if 'gzip' in request.headers.get('User-Agent', ''):
+            response.enable_compression()
+        return response
+
+    def page(self, query, total, make_item):
+        offset = int(query.get('pageToken', 0))
+        count = min(int(query.get('maxResults', 5)), 50, max(0, total - offset))
+        data = {
+            'pageInfo': {'totalResults': total, 'resultsPerPage': count},
+            'items': [make_item(offset + i) for i in range(count)],
+        }
+
+        if offset + count < total:
+            data['nextPageToken'] = str(offset + count)
+        return data
+
+    def build_search(self, query):
+        kind = query.get('type', 'video')
+
+        def make_item(index):
+            item = {'kind': 'youtube#searchResult', 'id': {'kind': f'youtube#{kind}', f'{kind}Id': video_id(index)}}
+            if 'snippet' in query.get('part', ''):
+                item['snippet'] = self.snippet(video_id(index))
+            return item
+
+        return self.page(query, self.search_results, make_item)
+
+    def build_playlistItems(self, query):
+        def make_item(index):
+            details = {'videoId': video_id(index), 'videoPublishedAt': '2018-01-01T00:00:00.000Z'}
+            return {'kind': 'youtube#playlistItem', 'id': f'item{index}', 'contentDetails': details}
+
+        return self.page(query, self.playlist_size, make_item)
+
+    def snippet(self, item_id):
+        return {
+            'publishedAt': '2018-01-01T00:00:00.000Z',
+            'title': f'Benchmark {item_id}',
+            'description': self.description,
+            'channelTitle': 'Benchmark Channel',
+            'thumbnails': THUMBNAILS,
+        }
+
+    def build_videos(self, query):
+        statistics = {'viewCount': '1000', 'likeCount': '100', 'dislikeCount': '1',
+                      'favoriteCount': '0', 'commentCount': '10'}
+        items = [{'kind': 'youtube#video', 'id': item_id, 'snippet': self.snippet(item_id), 'statistics': statistics,
+                  'contentDetails': {'duration': 'PT4M13S'}}
+                 for item_id in query['id'].split(',')]
+        return {'items': items}
+
+    def build_channels(self, query):
+        ids = query['id'].split(',') if 'id' in query else [f'UC{query["forUsername"]}']
+        statistics = {'subscriberCount': '1000', 'videoCount': str(self.playlist_size), 'viewCount': '100000'}
+        items = [{'kind': 'youtube#channel', 'id': item_id, 'snippet': self.snippet(item_id), 'statistics': statistics,
+                  'contentDetails': {'relatedPlaylists': {'uploads': f'UU{item_id}'}}}
+                 for item_id in ids]
+        return {'items': items}
+
+    def build_playlists(self, query):
+        details = {'itemCount': self.playlist_size}
+        items = [{'kind': 'youtube#playlist', 'id': item_id, 'snippet': self.snippet(item_id), 'contentDetails': details}
+                 for item_id in query['id'].split(',')]
+        return {'items': items}
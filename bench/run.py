@@ -0,0 +1,169 @@
+"""Drives the YouTube cog's commands against a local mock of the YouTube API.
+
+    python -m bench.run search info --concurrency 16 --commands 500 --output results.json
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import resource
+import tempfile
+import statistics
+from collections import Counter
+
+import cogs.youtube
+from cogs.youtube import YouTube, Query, VIDEO_BASE, PLAYLIST_BASE
+
+from utils import make_session
+
+from .mock_api import MockYouTube, video_id
+from .fakes import BenchBot, FakeContext
+
+
+async def run_search(cog, ctx, index, args):
+    params = await Query(type='video').convert(ctx, f'{args.results} benchmark query {index}')
+    await YouTube.search.callback(cog, ctx, params=params)
+
+
+async def run_info(cog, ctx, index, args):
+    await YouTube.info.callback(cog, ctx, VIDEO_BASE + video_id(index))
+
+
+async def run_dump(cog, ctx, index, args):
+    await YouTube.dump.callback(cog, ctx, arguments=f'{PLAYLIST_BASE}PLbench{index}')
+
+
+SCENARIOS = {
+    'search': run_search,
+    'info': run_info,
+    'dump': run_dump,
+}
+
+
+def peak_rss():
+    # ru_maxrss is in KiB on Linux and covers the mock API too, as it shares the process
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+async def run_scenario(name, args, loop):
+    api = MockYouTube(latency=args.latency, jitter=args.jitter, search_results=args.results,
+                      playlist_size=args.playlist_size)
+    await api.start()
+    cogs.youtube.API_BASE = api.url
+
+    with tempfile.TemporaryDirectory() as directory:
+        session = make_session(loop)
+        bot = BenchBot(loop, session, os.path.join(directory, 'cache.db'))
+        cog = YouTube(bot)
+        bot.add_cog(cog)
+
+        scenario = SCENARIOS[name]
+        semaphore = asyncio.Semaphore(args.concurrency)
+        latencies = []
+        errors = Counter()
+        contexts = []
+
+        async def one(index):
+            ctx = FakeContext(bot, user_id=index % args.users + 1, guild_id=index % args.guilds + 1)
+            contexts.append(ctx)
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    await scenario(cog, ctx, index % args.distinct, args)
+                except Exception as e:
+                    errors[type(e).__name__] += 1
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(index) for index in range(args.commands)))
+        elapsed = time.perf_counter() - start
+
+        await bot.api_store.close()
+        await bot.search_index.close()
+        await bot.db.close()
+        await session.close()
+
+    await api.close()
+
+    calls = sum(api.calls.values())
+    return {
+        'scenario': name,
+        'commands': args.commands,
+        'errors': dict(errors),
+        'seconds': elapsed,
+        'throughput': args.commands / elapsed,
+        'latency': {
+            'mean': statistics.mean(latencies),
+            'p50': percentile(latencies, 0.50),
+            'p99': percentile(latencies, 0.99),
+            'max': max(latencies),
+        },
+        'api_calls': dict(api.calls),
+        'api_calls_per_command': calls / args.commands,
+        'api_bytes': dict(api.bytes_sent),
+        'api_kib_per_command': sum(api.bytes_sent.values()) / 1024 / args.commands,
+        'not_modified': api.not_modified,
+        'cache_hit_rate': cog.cache.hit_rate,
+        'messages_sent': sum(ctx.channel.sends for ctx in contexts),
+        'messages_edited': sum(ctx.channel.edits for ctx in contexts),
+        'peak_rss_mib': peak_rss(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('scenarios', nargs='*', metavar='scenario',
+                        help=f'any of {", ".join(SCENARIOS)}, all of them by default')
+    parser.add_argument('--commands', type=int, default=200, help='commands to run per scenario')
+    parser.add_argument('--concurrency', type=int, default=8, help='commands running at once')
+    parser.add_argument('--distinct', type=int, default=50, help='distinct queries, links or playlists to cycle through')
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--guilds', type=int, default=10)
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds the mock API takes to answer')
+    parser.add_argument('--jitter', type=float, default=0.01)
+    parser.add_argument('--results', type=int, default=25, help='search results requested per search')
+    parser.add_argument('--playlist-size', type=int, default=500)
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    args = parser.parse_args()
+
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f'unknown scenarios: {", ".join(sorted(unknown))}')
+    args.scenarios = args.scenarios or list(SCENARIOS)
+
+    loop = asyncio.get_event_loop()
+    results = []
+    for name in args.scenarios:
+        result = loop.run_until_complete(run_scenario(name, args, loop))
+        results.append(result)
+        latency = result['latency']
+        print(f'{name}: {result["throughput"]:.1f} commands/s, p50 {latency["p50"] * 1000:.1f}ms, '
+              f'p99 {latency["p99"] * 1000:.1f}ms, {result["api_calls_per_command"]:.2f} API calls/command, '
+              f'{result["api_kib_per_command"]:.1f} KiB/command, {sum(result["errors"].values())} errors')
+
+    print(f'peak memory: {peak_rss():.1f} MiB')
+
+    if args.output:
+        report = {
+            'created_at': time.time(),
+            'python': sys.version.split()[0],
+            'config': vars(args),
+            'peak_rss_mib': peak_rss(),
+            'results': results,
+        }
+        with open(args.output, 'w') as fp:
+            json.dump(report, fp, indent=2)
+
+
+if __name__ == '__main__':
+    main()
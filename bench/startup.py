@@ -0,0 +1,150 @@
+"""Measures how long a fresh bot process takes to load its extensions and answer its first command.
+
+    python -m bench.startup --runs 5 --budget 2.0
+
+The child process builds the real Bot, with lazy extensions and startup reporting, but never
+connects to the gateway. Exits with status 1 when the median time to the first handled command
+is over the budget.
+"""
+
+import sys
+import json
+import time
+import asyncio
+import argparse
+import statistics
+import subprocess
+
+
+def child():
+    # psutil knows when the interpreter itself was started, before any of our imports
+    import psutil
+    created = psutil.Process().create_time()
+
+    import os
+    import types
+    import shutil
+    import tempfile
+
+    # bot.py reads its settings from a config module, so the benchmark brings its own
+    directory = tempfile.mkdtemp()
+    config = types.ModuleType('config')
+    config.description = 'Startup benchmark'
+    config.youtube_key = 'bench'
+    config.feedback_channel = None
+    config.cache_path = os.path.join(directory, 'cache.db')
+    config.database_path = os.path.join(directory, 'youtube.db')
+    config.index_path = os.path.join(directory, 'index.db')
+    sys.modules['config'] = config
+
+    import bot
+    import cogs.youtube
+    from cogs.youtube import YouTube, VIDEO_BASE
+    from .mock_api import MockYouTube, video_id
+    from .fakes import FakeContext
+
+    imported = time.time() - created
+
+    class StartupBot(bot.Bot):
+        # everything up to the gateway runs as usual, the connection itself is skipped
+        async def login(self, *args, **kwargs):
+            pass
+
+        async def connect(self, *args, **kwargs):
+            pass
+
+    instance = StartupBot()
+    ready = time.time() - created
+
+    async def first_command():
+        api = MockYouTube(latency=0.0)
+        await api.start()
+        cogs.youtube.API_BASE = api.url
+
+        await instance.start('bench')
+        ctx = FakeContext(instance, user_id=1, guild_id=1)
+        await YouTube.info.callback(instance.get_cog('YouTube'), ctx, VIDEO_BASE + video_id(0))
+        handled = time.time() - created
+
+        # what help pays the first time it is used
+        instance.load_lazy('help')
+        deferred = time.time() - created
+
+        await instance.close()
+        await api.close()
+
+        # the pollers and init never finish without a gateway
+        # asyncio.all_tasks is new in 3.7 and the Task methods are gone from 3.9
+        all_tasks = getattr(asyncio, 'all_tasks', None) or asyncio.Task.all_tasks
+        current_task = getattr(asyncio, 'current_task', None) or asyncio.Task.current_task
+        for task in all_tasks():
+            if task is not current_task():
+                task.cancel()
+        return handled, deferred
+
+    handled, deferred = instance.loop.run_until_complete(first_command())
+    shutil.rmtree(directory, ignore_errors=True)
+    print(json.dumps({'imported': imported, 'ready': ready, 'first_command': handled, 'deferred': deferred}))
+
+
+def parse_importtime(stderr):
+    # lines look like "import time:       123 |       4567 |   package.module", nested ones indented further
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        if not name.startswith('  '):
+            modules[name.strip()] = (int(self_us) / 1e6, int(cumulative_us) / 1e6)
+
+    return modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget', type=float, default=2.0, help='seconds allowed until the first handled command')
+    parser.add_argument('--top', type=int, default=15, help='slowest top level imports to show')
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return child()
+
+    runs = []
+    modules = {}
+    for _ in range(args.runs):
+        process = subprocess.run([sys.executable, '-X', 'importtime', '-m', 'bench.startup', '--child'],
+                                 stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+        if process.returncode != 0:
+            print(process.stderr, file=sys.stderr)
+            sys.exit(process.returncode)
+
+        runs.append(json.loads(process.stdout.splitlines()[-1]))
+        modules = parse_importtime(process.stderr)
+
+    result = {phase: statistics.median(run[phase] for run in runs) for phase in runs[0]}
+
+    top_level = sorted(modules.items(), key=lambda item: -item[1][1])[:args.top]
+    for name, (_, cumulative) in top_level:
+        print(f'{name}: {cumulative * 1000:.1f}ms')
+
+    print(f'imports done after {result["imported"]:.2f}s, bot ready after {result["ready"]:.2f}s, '
+          f'first command handled after {result["first_command"]:.2f}s (budget {args.budget:.2f}s), '
+          f'deferred extensions loaded after {result["deferred"]:.2f}s')
+
+    if args.output:
+        report = {'budget': args.budget, 'runs': runs, 'median': result,
+                  'imports': {name: cumulative for name, (_, cumulative) in top_level}}
+        with open(args.output, 'w') as fp:
+            json.dump(report, fp, indent=2)
+
+    if result['first_command'] > args.budget:
+        print('Over the startup budget.', file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
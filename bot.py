@@ -1,56 +1,303 @@
+import os
+import ast
+import time
+import asyncio
 import datetime
+import importlib
 import traceback
 from pathlib import Path
+from collections import defaultdict
 
 import psutil
-import aiohttp
 import discord
 from discord.ext import commands
 
 import config
-from utils import human_time, CaseInsensitiveDict
+from utils import human_time, CaseInsensitiveDict, Database, DiskCache, SearchIndex, PaginatorManager, WebSubServer, \
+    make_session, Metrics, MetricsServer, LoopMonitor, ClusterClient, sample_lag
+
+DEFAULT_PREFIXES = ('yt ',)
+
+# paginators wait two minutes for each reaction
+SESSION_BUCKETS = (1.0, 5.0, 30.0, 120.0, 300.0, 600.0, 1800.0)
+
+# extensions that are only imported once one of their commands is used
+LAZY_EXTENSIONS = ('info', 'owner', 'settings')
+
+
+def command_names(path):
+    """Reads the names and aliases of the top level commands a cog declares, without importing it."""
+
+    names = []
+    for node in ast.walk(ast.parse(path.read_text())):
+        if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            continue
+
+        for decorator in node.decorator_list:
+            if not isinstance(decorator, ast.Call):
+                continue
+
+            # commands.command(), commands.group() or utils.group(), but not some_group.command()
+            func = decorator.func
+            if isinstance(func, ast.Attribute) and isinstance(func.value, ast.Name) and func.value.id == 'commands':
+                kind = func.attr
+            elif isinstance(func, ast.Name):
+                kind = func.id
+            else:
+                continue
+
+            if kind not in ('command', 'group'):
+                continue
+
+            keywords = {keyword.arg: ast.literal_eval(keyword.value) for keyword in decorator.keywords
+                        if keyword.arg in ('name', 'aliases')}
+            names.append(keywords.get('name', node.name))
+            names.extend(keywords.get('aliases', ()))
+
+    return names
 
 
 def _check(ctx):
     return not ctx.author.bot
 
 
+def _get_prefix(bot, message):
+    if message.guild is None:
+        return DEFAULT_PREFIXES
+    return bot.prefixes.get(message.guild.id, DEFAULT_PREFIXES)
+
+
 class Context(commands.Context):
+    responded_at = None
+
     @property
     def session(self):
         return self.bot.session
 
+    def responded(self):
+        if self.responded_at is None:
+            self.responded_at = time.perf_counter()
 
-class Bot(commands.Bot):
-    def __init__(self):
-        super().__init__(command_prefix='yt ', description=config.description,
-                         pm_help=None, game=discord.Game(name='yt help'))
+    async def send(self, *args, **kwargs):
+        message = await super().send(*args, **kwargs)
+        self.responded()
+        return message
+
+
+class Bot(commands.AutoShardedBot):
+    def __init__(self, *, shard_ids=None, shard_count=None, cluster_id=None, cluster_url=None):
+        super().__init__(command_prefix=_get_prefix, description=config.description,
+                         pm_help=None, game=discord.Game(name='yt help'),
+                         shard_ids=shard_ids, shard_count=shard_count)
 
         self.all_commands = CaseInsensitiveDict(self.all_commands)
         self.add_check(_check)
 
         self.youtube_key = config.youtube_key
-        self.session = aiohttp.ClientSession(loop=self.loop)
+        self.youtube_quota = getattr(config, 'youtube_quota', 10000)
+        self.guild_quota = getattr(config, 'guild_quota', 2000)
+        self.user_quota = getattr(config, 'user_quota', 500)
+        self.guild_weights = getattr(config, 'guild_weights', {})
+        # answer searches from videos seen before when the index has enough of them
+        self.local_search = getattr(config, 'local_search', False)
+
+        # set when launcher.py runs this process as one of several
+        self.cluster = ClusterClient(self, cluster_url, cluster_id) if cluster_url else None
+
+        self.session = make_session(self.loop)
+        self.api_store = DiskCache(getattr(config, 'cache_path', 'cache.db'))
+        self.db = Database(getattr(config, 'database_path', 'youtube.db'))
+        self.search_index = SearchIndex(getattr(config, 'index_path', 'index.db'))
         self.process = psutil.Process()
+        self.paginators = PaginatorManager(self.loop)
 
-        startup_extensions = [x.stem for x in Path('cogs').glob('*.py')]
-        for extension in startup_extensions:
-            try:
-                self.load_extension(f'cogs.{extension}')
-            except:
-                print(f'Failed to load extension {extension}.')
-                traceback.print_exc()
+        # guild id -> custom prefixes, longest first
+        self.prefixes = {}
+        self.messages_filtered = 0
+        self.messages_dispatched = 0
+
+        self.metrics = Metrics()
+        self.command_latency = self.metrics.histogram('discord_command_seconds', 'Time until a command first replies.',
+                                                      labels=('command', 'status'))
+        self.command_duration = self.metrics.histogram('discord_command_session_seconds',
+                                                       'Time until a command finishes, paginator sessions included.',
+                                                       labels=('command',), buckets=SESSION_BUCKETS)
+        self.events = self.metrics.counter('discord_events_total', 'Gateway events dispatched.', labels=('event',))
+        self.loop_lag = self.metrics.histogram('event_loop_lag_seconds', 'How late the event loop wakes up.')
+        self.loop_monitor = LoopMonitor(self.loop, threshold=getattr(config, 'slow_callback', 0.25))
+        self.metrics.callback('event_loop_stalls_total', 'Times the event loop was blocked past the threshold.',
+                              lambda: self.loop_monitor.stalls, kind='counter')
+        self.metrics.callback('discord_paginators_active', 'Paginator sessions waiting on reactions.',
+                              lambda: len(self.paginators))
+        self.metrics.callback('discord_messages_total', 'Messages seen, by whether they were commands.',
+                              lambda: {('filtered',): self.messages_filtered, ('dispatched',): self.messages_dispatched},
+                              labels=('outcome',), kind='counter')
+
+        # the metrics endpoint is only meant to be scraped locally, so it is opt in
+        metrics = getattr(config, 'metrics', None)
+        if metrics and self.cluster is not None:
+            metrics = dict(metrics, port=metrics.get('port', 9100) + self.cluster.cluster_id)
+        self.metrics_server = MetricsServer(self.metrics, **metrics) if metrics else None
 
+        # push notifications need a public callback url, so they are opt in
+        websub = getattr(config, 'websub', None)
+        self.websub = WebSubServer(self, **websub) if websub and self.is_primary else None
+
+        # seconds from process start to each phase, and per extension to import and set up
+        self.startup = {}
+        self.extension_times = {}
+        self.metrics.callback('bot_startup_seconds', 'Seconds from process start to each startup phase.',
+                              lambda: {(phase,): seconds for phase, seconds in self.startup.items()},
+                              labels=('phase',))
+        self.metrics.callback('bot_extension_load_seconds', 'Seconds spent importing and setting up extensions.',
+                              lambda: {(extension, stage): seconds
+                                       for extension, times in self.extension_times.items()
+                                       for stage, seconds in zip(('import', 'setup'), times)},
+                              labels=('extension', 'stage'))
+
+        lazy = getattr(config, 'lazy_cogs', True)
+        self.lazy_commands = {}
+        for path in sorted(Path('cogs').glob('*.py')):
+            extension = path.stem
+            if lazy and extension in LAZY_EXTENSIONS:
+                self.lazy_commands.update(dict.fromkeys(command_names(path), extension))
+            else:
+                self.load_timed(extension)
+
+        self.report_startup()
         self.loop.create_task(self.init())
 
+    def since_start(self):
+        return time.time() - self.process.create_time()
+
+    def load_timed(self, extension):
+        name = f'cogs.{extension}'
+        try:
+            start = time.perf_counter()
+            importlib.import_module(name)
+            imported = time.perf_counter()
+            self.load_extension(name)
+        except:
+            print(f'Failed to load extension {extension}.')
+            traceback.print_exc()
+        else:
+            self.extension_times[extension] = (imported - start, time.perf_counter() - imported)
+
+    def load_lazy(self, command):
+        # help lists every command, so it needs everything that is still deferred
+        if command == 'help':
+            extensions = set(self.lazy_commands.values())
+        else:
+            extensions = {self.lazy_commands[command]} if command in self.lazy_commands else set()
+
+        for extension in extensions:
+            self.load_timed(extension)
+            print(f'Loaded deferred extension {extension} for {command}.')
+
+        self.lazy_commands = {k: v for k, v in self.lazy_commands.items() if v not in extensions}
+        return bool(extensions)
+
+    def report_startup(self):
+        self.startup['extensions'] = self.since_start()
+        for extension, (import_time, setup_time) in sorted(self.extension_times.items(), key=lambda x: -sum(x[1])):
+            print(f'{extension}: import {import_time * 1000:.1f}ms, setup {setup_time * 1000:.1f}ms')
+
+        deferred = sorted(set(self.lazy_commands.values()))
+        if deferred:
+            print(f'Deferred until first use: {", ".join(deferred)}')
+        print(f'Extensions loaded {self.startup["extensions"]:.2f}s after start.')
+
     async def init(self):
+        if self.cluster is not None:
+            self.cluster.start()
+
+        self.loop_monitor.start()
+        self.loop.create_task(sample_lag(self.loop, self.loop_lag))
+
+        # none of these depend on each other or on the gateway
+        pending = [self.load_prefixes()]
+        if self.metrics_server is not None:
+            pending.append(self.metrics_server.start())
+        if self.websub is not None:
+            pending.append(self.websub.start())
+        await asyncio.gather(*pending)
+
         await self.wait_until_ready()
         self.start_time = datetime.datetime.utcnow()
+        self.startup['ready'] = self.since_start()
+        self.feedback_channel = self.get_channel(config.feedback_channel)
 
+    async def login(self, *args, **kwargs):
+        await super().login(*args, **kwargs)
+        # the owner can be fetched while the gateway is still streaming in guilds
+        self.loop.create_task(self.fetch_owner())
+
+    async def fetch_owner(self):
         app_info = await self.application_info()
         self.owner_id = app_info.owner.id
 
-        self.feedback_channel = self.get_channel(config.feedback_channel)
+    async def load_prefixes(self):
+        await self.db.execute('CREATE TABLE IF NOT EXISTS prefixes ('
+                              'guild_id INTEGER, prefix TEXT, PRIMARY KEY (guild_id, prefix))')
+
+        prefixes = defaultdict(list)
+        for guild_id, prefix in await self.db.fetchall('SELECT guild_id, prefix FROM prefixes'):
+            prefixes[guild_id].append(prefix)
+
+        for guild_id, guild_prefixes in prefixes.items():
+            self.index_prefixes(guild_id, guild_prefixes)
+
+    def index_prefixes(self, guild_id, prefixes):
+        if prefixes:
+            self.prefixes[guild_id] = tuple(sorted(prefixes, key=len, reverse=True))
+        else:
+            self.prefixes.pop(guild_id, None)
+
+    @property
+    def is_primary(self):
+        # background polling only happens in one process of a cluster
+        return self.cluster is None or self.cluster.is_primary
+
+    def local_stats(self):
+        return {
+            'cluster_id': self.cluster.cluster_id if self.cluster is not None else 0,
+            'shards': list(self.shard_ids or range(self.shard_count or 1)),
+            'guilds': len(self.guilds),
+            'memory': self.process.memory_full_info().uss,
+        }
+
+    async def cluster_stats(self):
+        if self.cluster is not None:
+            try:
+                return await self.cluster.cluster_stats()
+            except (ConnectionError, asyncio.TimeoutError):
+                pass
+        return [self.local_stats()]
+
+    def post_to(self, channel_ids, content):
+        # channels on shards run by other processes are posted to by those processes
+        remote = []
+        for channel_id in channel_ids:
+            channel = self.get_channel(channel_id)
+            if channel is not None:
+                self.loop.create_task(self.post(channel, content))
+            else:
+                remote.append(channel_id)
+
+        if remote and self.cluster is not None:
+            self.loop.create_task(self.cluster.publish('post', {'channels': remote, 'content': content}))
+
+    async def post(self, channel, content):
+        try:
+            await channel.send(content)
+        except discord.HTTPException:
+            pass
+
+    async def on_cluster_post(self, data):
+        for channel_id in data['channels']:
+            channel = self.get_channel(channel_id)
+            if channel is not None:
+                await self.post(channel, data['content'])
 
     @property
     def owner(self):
@@ -72,6 +319,16 @@ class Bot(commands.Bot):
         return f'{cpu_usage}%'
 
     async def close(self):
+        self.loop_monitor.stop()
+        if self.cluster is not None:
+            await self.cluster.close()
+        if self.metrics_server is not None:
+            await self.metrics_server.close()
+        if self.websub is not None:
+            await self.websub.close()
+        await self.api_store.close()
+        await self.search_index.close()
+        await self.db.close()
         await self.session.close()
         await super().close()
 
@@ -79,11 +336,48 @@ class Bot(commands.Bot):
         print(f'Logged in as {self.user}')
         print('---------------')
 
+    def dispatch(self, event_name, *args, **kwargs):
+        self.events.inc(event_name)
+        super().dispatch(event_name, *args, **kwargs)
+
+    async def on_reaction_add(self, reaction, user):
+        self.paginators.dispatch(reaction, user)
+
     async def on_message(self, message):
+        # almost no message is a command, so skip building a context for them
+        if message.author.bot or not message.content.startswith(_get_prefix(self, message)):
+            self.messages_filtered += 1
+            return
+
+        self.messages_dispatched += 1
         ctx = await self.get_context(message, cls=Context)
+        if self.lazy_commands and (ctx.command is None or ctx.command.name == 'help'):
+            if ctx.invoked_with and self.load_lazy(ctx.invoked_with.lower()):
+                ctx = await self.get_context(message, cls=Context)
+
+        start = time.perf_counter()
         await self.invoke(ctx)
 
+        if 'first_command' not in self.startup and ctx.command is not None:
+            self.startup['first_command'] = self.since_start()
+            print(f'Handled the first command {self.startup["first_command"]:.2f}s after start.')
+
+        # paginated commands only finish once their session times out, long after their first reply
+        if ctx.command is not None:
+            end = time.perf_counter()
+            command = (ctx.invoked_subcommand or ctx.command).qualified_name
+            status = 'error' if ctx.command_failed else 'ok'
+            self.command_latency.observe((ctx.responded_at or end) - start, command, status)
+            self.command_duration.observe(end - start, command)
+
 
 if __name__ == '__main__':
-    bot = Bot()
+    shard_ids = os.environ.get('YTBOT_SHARD_IDS')
+    shard_count = os.environ.get('YTBOT_SHARD_COUNT')
+    cluster_id = os.environ.get('YTBOT_CLUSTER_ID')
+
+    bot = Bot(shard_ids=[int(x) for x in shard_ids.split(',')] if shard_ids else None,
+              shard_count=int(shard_count) if shard_count else None,
+              cluster_id=int(cluster_id) if cluster_id else None,
+              cluster_url=os.environ.get('YTBOT_CLUSTER_URL'))
     bot.run(config.token)
@@ -1,6 +1,5 @@
 import os
 import inspect
-import pkg_resources
 
 import discord
 from discord.ext import commands
@@ -28,6 +27,9 @@ class Info:
     async def about(self, ctx):
         """Tells you information about the bot itself."""
 
+        # pkg_resources scans every installed distribution on import, so it is only paid for here
+        import pkg_resources
+
         recent_changes, _ = await self.get_recent_changes(limit=3)
         owner = ctx.bot.owner
         version = pkg_resources.get_distribution('discord.py')
@@ -35,9 +37,19 @@ class Info:
         embed = discord.Embed(color=0xFF0000, timestamp=ctx.bot.start_time)
         embed.set_author(name=owner, icon_url=owner.avatar_url)
         embed.add_field(name='Uptime', value=ctx.bot.uptime)
-        embed.add_field(name='Servers', value=len(ctx.bot.guilds), inline=False)
-        embed.add_field(name='Memory Usage', value=ctx.bot.memory_usage)
+
+        if ctx.bot.cluster is None:
+            embed.add_field(name='Servers', value=len(ctx.bot.guilds), inline=False)
+            embed.add_field(name='Memory Usage', value=ctx.bot.memory_usage)
+        else:
+            stats = await ctx.bot.cluster_stats()
+            servers = sum(process['guilds'] for process in stats)
+            shards = sum(len(process['shards']) for process in stats)
+            memory = sum(process['memory'] for process in stats) / 1024**2
+            embed.add_field(name='Servers', value=f'{servers} ({shards} shards, {len(stats)} processes)', inline=False)
+            embed.add_field(name='Memory Usage', value=f'{memory:.2f} MiB')
         embed.add_field(name='CPU Usage', value=ctx.bot.cpu_usage)
+        embed.add_field(name='Active Paginators', value=len(ctx.bot.paginators))
         embed.add_field(name='Recent Changes', value=recent_changes, inline=False)
         embed.set_footer(text=f'Made with {version}', icon_url='http://i.imgur.com/5BFecvA.png')
 
@@ -0,0 +1,335 @@
+import time
+import asyncio
+import datetime
+import traceback
+from collections import defaultdict
+
+import discord
+from discord.ext import commands
+import dateutil.parser
+
+from utils import EmbedPaginator, QuotaExceeded, Priority, DueQueue, group
+from cogs.youtube import VIDEO_BASE, VIDEO_REGEX
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS streams (
+    video_id TEXT PRIMARY KEY,
+    title TEXT,
+    channel_title TEXT,
+    state TEXT,
+    scheduled_start REAL,
+    next_poll REAL
+);
+
+CREATE TABLE IF NOT EXISTS stream_alerts (
+    guild_id INTEGER,
+    channel_id INTEGER,
+    video_id TEXT,
+    PRIMARY KEY (channel_id, video_id)
+);
+'''
+
+# the most videos.list accepts per call
+POLL_BATCH = 50
+
+# upcoming streams are polled more often the closer they get to their scheduled start
+MIN_INTERVAL = 60
+MAX_INTERVAL = 60 * 60
+LIVE_INTERVAL = 5 * 60
+
+# streams due this soon after the first due one are polled early to fill the batch,
+# and uploads tracked without details wait as long for their first poll so they arrive together
+POLL_SLACK = MIN_INTERVAL / 2
+
+# streams that still have not started this long after their scheduled start are dropped
+LATE_LIMIT = 12 * 60 * 60
+
+
+def get_state(item):
+    details = item.get('liveStreamingDetails')
+    if details is None:
+        return None
+
+    if 'actualEndTime' in details:
+        return 'ended'
+
+    if 'actualStartTime' in details:
+        return 'live'
+
+    return 'upcoming'
+
+
+class Stream:
+    __slots__ = ('video_id', 'title', 'channel_title', 'state', 'scheduled_start', 'next_poll', 'viewers')
+
+    def __init__(self, video_id, title=None, channel_title=None, state='new', scheduled_start=None, next_poll=0.0):
+        self.video_id = video_id
+        self.title = title
+        self.channel_title = channel_title
+        self.state = state
+        self.scheduled_start = scheduled_start
+        self.next_poll = next_poll
+        self.viewers = None
+
+    def to_row(self):
+        return (self.video_id, self.title, self.channel_title, self.state, self.scheduled_start, self.next_poll)
+
+    def update(self, item):
+        snippet = item['snippet']
+        details = item['liveStreamingDetails']
+
+        self.title = snippet['title']
+        self.channel_title = snippet['channelTitle']
+        self.state = get_state(item)
+
+        scheduled_start = details.get('scheduledStartTime')
+        if scheduled_start is not None:
+            self.scheduled_start = dateutil.parser.parse(scheduled_start).timestamp()
+
+        viewers = details.get('concurrentViewers')
+        self.viewers = int(viewers) if viewers is not None else None
+
+    def next_interval(self, now):
+        if self.state == 'live':
+            return LIVE_INTERVAL
+
+        if self.state == 'upcoming' and self.scheduled_start is not None:
+            return max(MIN_INTERVAL, min(MAX_INTERVAL, (self.scheduled_start - now) / 4))
+
+        return MIN_INTERVAL
+
+
+class Livestreams:
+    def __init__(self, bot):
+        self.bot = bot
+        self.streams = {}
+        self.alerts = defaultdict(set)
+        self.due = DueQueue()
+        self._task = bot.loop.create_task(self.poll_loop())
+
+    def __unload(self):
+        self._task.cancel()
+
+    async def __error(self, ctx, exception):
+        if isinstance(exception, (commands.BadArgument, commands.CheckFailure, QuotaExceeded)):
+            await ctx.send(exception)
+
+    @property
+    def youtube(self):
+        return self.bot.get_cog('YouTube')
+
+    async def load(self):
+        await self.bot.db.executescript(SCHEMA)
+
+        for row in await self.bot.db.fetchall('SELECT * FROM streams'):
+            stream = Stream(*row)
+            self.streams[stream.video_id] = stream
+            self.due.schedule(stream.video_id, stream.next_poll)
+
+        for channel_id, video_id in await self.bot.db.fetchall('SELECT channel_id, video_id FROM stream_alerts'):
+            self.alerts[video_id].add(channel_id)
+
+    async def save(self, streams):
+        rows = [stream.to_row() for stream in streams if self.streams.get(stream.video_id) is stream]
+        await self.bot.db.executemany('INSERT OR REPLACE INTO streams VALUES (?, ?, ?, ?, ?, ?)', rows)
+
+    async def drop(self, streams):
+        rows = [(stream.video_id,) for stream in streams]
+        for stream in streams:
+            self.streams.pop(stream.video_id, None)
+            self.alerts.pop(stream.video_id, None)
+            self.due.discard(stream.video_id)
+
+        await self.bot.db.executemany('DELETE FROM streams WHERE video_id = ?', rows)
+        await self.bot.db.executemany('DELETE FROM stream_alerts WHERE video_id = ?', rows)
+
+    def schedule(self, stream, delay):
+        stream.next_poll = time.time() + delay
+        self.due.schedule(stream.video_id, stream.next_poll)
+
+    async def track(self, video_id, targets, *, item=None):
+        # videos that turn out not to be livestreams are dropped on their first poll
+        stream = self.streams.get(video_id)
+        if stream is None:
+            stream = self.streams[video_id] = Stream(video_id)
+            if item is not None:
+                stream.update(item)
+                self.schedule(stream, stream.next_interval(time.time()))
+            else:
+                self.schedule(stream, POLL_SLACK)
+            await self.save([stream])
+
+        query = 'INSERT OR IGNORE INTO stream_alerts VALUES (?, ?, ?)'
+        await self.bot.db.executemany(query, [(guild_id, channel_id, video_id) for guild_id, channel_id in targets])
+        self.alerts[video_id].update(channel_id for _, channel_id in targets)
+        return stream
+
+    async def reload(self, video_id):
+        row = await self.bot.db.fetchone('SELECT * FROM streams WHERE video_id = ?', video_id)
+        query = 'SELECT channel_id FROM stream_alerts WHERE video_id = ?'
+        alerts = {channel_id for channel_id, in await self.bot.db.fetchall(query, video_id)}
+
+        if row is None:
+            self.streams.pop(video_id, None)
+            self.alerts.pop(video_id, None)
+            self.due.discard(video_id)
+            return
+
+        self.alerts[video_id] = alerts
+        if video_id not in self.streams:
+            stream = self.streams[video_id] = Stream(*row)
+            self.due.schedule(video_id, stream.next_poll)
+
+    async def on_cluster_stream_changed(self, data):
+        await self.reload(data['video_id'])
+
+    async def poll_loop(self):
+        await self.bot.wait_until_ready()
+        await self.load()
+        if not self.bot.is_primary:
+            return
+
+        while True:
+            batch = [self.streams[video_id] for video_id in self.due.pop_due(POLL_BATCH, slack=POLL_SLACK)]
+            if not batch:
+                await self.due.wait()
+                continue
+
+            try:
+                await self.poll(batch)
+            except asyncio.CancelledError:
+                raise
+            except QuotaExceeded as e:
+                for stream in batch:
+                    self.schedule(stream, e.retry_after)
+            except Exception:
+                traceback.print_exc()
+                for stream in batch:
+                    self.schedule(stream, MIN_INTERVAL)
+
+    async def poll(self, streams):
+        params = {'id': ','.join(stream.video_id for stream in streams), 'part': 'snippet,liveStreamingDetails'}
+        data = await self.youtube.fetch(None, 'videos', params, Priority.BULK)
+        if data is None:
+            raise RuntimeError('Could not fetch livestream details.')
+
+        items = {item['id']: item for item in data['items']}
+        now = time.time()
+        active, finished, went_live = [], [], []
+
+        for stream in streams:
+            item = items.get(stream.video_id)
+            if item is None or get_state(item) in (None, 'ended'):
+                finished.append(stream)
+                continue
+
+            previous = stream.state
+            stream.update(item)
+
+            if stream.state == 'live' and previous != 'live':
+                went_live.append(stream)
+
+            if stream.state == 'upcoming' and stream.scheduled_start is not None and \
+               now - stream.scheduled_start > LATE_LIMIT:
+                finished.append(stream)
+                continue
+
+            self.schedule(stream, stream.next_interval(now))
+            active.append(stream)
+
+        # state is saved before alerting so a crash can never repeat an alert
+        await self.save(active)
+        if finished:
+            await self.drop(finished)
+
+        for stream in went_live:
+            self.alert(stream)
+
+    def alert(self, stream):
+        content = f'\N{LARGE RED CIRCLE} **{stream.channel_title}** is live: **{stream.title}**\n{VIDEO_BASE}{stream.video_id}'
+        self.bot.post_to(self.alerts.get(stream.video_id, ()), content)
+
+    async def get_item(self, ctx, link):
+        match = VIDEO_REGEX.match(link)
+        if match is None:
+            raise commands.BadArgument('This is not a valid link.')
+
+        params = {'id': match.group('video_id'), 'part': 'snippet,liveStreamingDetails'}
+        data = await self.youtube.request(ctx, 'videos', params)
+        item = data['items'][0] if data and data['items'] else None
+        if item is None or get_state(item) is None:
+            raise commands.BadArgument('This is not a valid livestream.')
+
+        return item
+
+    @group(invoke_without_command=True)
+    async def stream(self, ctx, link: str):
+        """Gets info about a livestream."""
+
+        item = await self.get_item(ctx, link)
+
+        # tracked streams have fresher viewer counts than the response cache
+        stream = self.streams.get(item['id'])
+        if stream is None or stream.title is None:
+            stream = Stream(item['id'])
+            stream.update(item)
+
+        embed = discord.Embed(title=stream.title, color=0xFF0000, url=VIDEO_BASE + stream.video_id)
+        embed.add_field(name='Status', value=stream.state.title())
+        embed.add_field(name='Channel', value=stream.channel_title)
+        if stream.viewers is not None:
+            embed.add_field(name='Viewers', value=stream.viewers)
+
+        if stream.state == 'upcoming' and stream.scheduled_start is not None:
+            embed.timestamp = datetime.datetime.utcfromtimestamp(stream.scheduled_start)
+            embed.set_footer(text='Scheduled')
+
+        await ctx.send(embed=embed)
+
+    @stream.command(name='watch')
+    @commands.guild_only()
+    @commands.has_permissions(manage_guild=True)
+    async def stream_watch(self, ctx, channel: discord.TextChannel, link: str):
+        """Posts in a text channel when a livestream goes live."""
+
+        item = await self.get_item(ctx, link)
+        state = get_state(item)
+        if state != 'upcoming':
+            return await ctx.send(f'This livestream is already {state}.')
+
+        stream = await self.track(item['id'], [(ctx.guild.id, channel.id)], item=item)
+
+        # the process polling streams may not be this one
+        if self.bot.cluster is not None:
+            await self.bot.cluster.publish('stream_changed', {'video_id': stream.video_id})
+
+        await ctx.send(f'I will post in {channel.mention} when **{stream.title}** goes live.')
+
+    @stream.command(name='list')
+    @commands.guild_only()
+    async def stream_list(self, ctx):
+        """Shows the livestreams this server is waiting on."""
+
+        query = 'SELECT video_id, channel_id FROM stream_alerts WHERE guild_id = ?'
+        rows = await self.bot.db.fetchall(query, ctx.guild.id)
+
+        entries = []
+        for video_id, channel_id in rows:
+            stream = self.streams.get(video_id)
+            if stream is not None and stream.title is not None:
+                entries.append(f'[{stream.title}]({VIDEO_BASE}{video_id}) ({stream.state}) \N{RIGHTWARDS ARROW} <#{channel_id}>')
+
+        if not entries:
+            return await ctx.send('This server is not waiting on any livestreams.')
+
+        try:
+            paginator = EmbedPaginator(ctx, entries=entries)
+            paginator.embed.title = 'Livestreams'
+            paginator.embed.color = 0xFF0000
+            await paginator.paginate()
+        except Exception as e:
+            await ctx.send(e)
+
+
+def setup(bot):
+    bot.add_cog(Livestreams(bot))
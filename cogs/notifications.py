@@ -0,0 +1,407 @@
+import time
+import random
+import asyncio
+import datetime
+import traceback
+from collections import defaultdict, deque
+
+import aiohttp
+import discord
+from discord.ext import commands
+
+from utils import websub, EmbedPaginator, QuotaExceeded, Priority, DueQueue, group
+from cogs.youtube import VIDEO_BASE, CHANNEL_REGEX
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS feeds (
+    youtube_id TEXT PRIMARY KEY,
+    title TEXT,
+    uploads TEXT,
+    video_count INTEGER,
+    last_published TEXT,
+    seen TEXT,
+    interval REAL,
+    next_poll REAL
+);
+
+CREATE TABLE IF NOT EXISTS subscriptions (
+    guild_id INTEGER,
+    channel_id INTEGER,
+    youtube_id TEXT,
+    PRIMARY KEY (channel_id, youtube_id)
+);
+'''
+
+# the most channels.list accepts per call
+POLL_BATCH = 50
+
+# seconds between polls of one channel, halved after an upload and grown while it stays quiet
+DEFAULT_INTERVAL = 15 * 60
+MIN_INTERVAL = 5 * 60
+MAX_INTERVAL = 6 * 60 * 60
+
+# feeds due this soon after the first due one are polled early to fill the batch
+POLL_SLACK = MIN_INTERVAL / 4
+
+# videoCount lags behind and stays the same when a video is deleted and another uploaded,
+# so feeds whose count has not moved are also checked this often, on the Atom feed since it costs no quota
+RECHECK_INTERVAL = 24 * 60 * 60
+
+SEEN_LIMIT = 20
+
+
+def unseen(feed, uploads):
+    """Filters (video ID, publish time) pairs, oldest first, down to the ones the feed has not announced."""
+
+    new = []
+    last_published = feed.last_published
+    for video_id, published in uploads:
+        published = published[:19]
+        if video_id in feed.seen or published <= last_published:
+            continue
+
+        new.append((video_id, published))
+        last_published = published
+
+    return new
+
+
+class Feed:
+    __slots__ = ('youtube_id', 'title', 'uploads', 'video_count', 'last_published', 'seen', 'interval', 'next_poll',
+                 'checked_at')
+
+    def __init__(self, youtube_id, title, uploads, video_count, last_published, seen, interval, next_poll):
+        self.youtube_id = youtube_id
+        self.title = title
+        self.uploads = uploads
+        self.video_count = video_count
+        self.last_published = last_published
+        self.seen = deque(seen.split(), maxlen=SEEN_LIMIT)
+        self.interval = interval
+        self.next_poll = next_poll
+        self.checked_at = time.time()
+
+    def to_row(self):
+        return (self.youtube_id, self.title, self.uploads, self.video_count,
+                self.last_published, ' '.join(self.seen), self.interval, self.next_poll)
+
+
+class Notifications:
+    def __init__(self, bot):
+        self.bot = bot
+        self.feeds = {}
+        # youtube id -> {channel id: guild id}
+        self.subscribers = defaultdict(dict)
+        self.due = DueQueue()
+        self._task = bot.loop.create_task(self.poll_loop())
+
+    def __unload(self):
+        self._task.cancel()
+
+    async def __error(self, ctx, exception):
+        if isinstance(exception, (commands.BadArgument, commands.CheckFailure, QuotaExceeded)):
+            await ctx.send(exception)
+
+    @property
+    def youtube(self):
+        return self.bot.get_cog('YouTube')
+
+    async def load(self):
+        await self.bot.db.executescript(SCHEMA)
+
+        now = time.time()
+        for row in await self.bot.db.fetchall('SELECT * FROM feeds'):
+            feed = Feed(*row)
+            # spread out so a restart does not recheck every feed at once
+            feed.checked_at = now - random.uniform(0, RECHECK_INTERVAL)
+            self.feeds[feed.youtube_id] = feed
+            self.due.schedule(feed.youtube_id, feed.next_poll)
+
+        for guild_id, channel_id, youtube_id in await self.bot.db.fetchall('SELECT * FROM subscriptions'):
+            self.subscribers[youtube_id][channel_id] = guild_id
+
+        if self.bot.websub is not None:
+            self.bot.loop.create_task(self.subscribe_all())
+
+    async def subscribe_all(self):
+        for youtube_id in list(self.feeds):
+            await self.push_subscribe(youtube_id)
+
+    async def push_subscribe(self, youtube_id):
+        try:
+            await self.bot.websub.subscribe(youtube_id)
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            # the lease renewal loop tries again later
+            pass
+
+    async def save(self, feeds):
+        # feeds can be unsubscribed from while they are being polled
+        rows = [feed.to_row() for feed in feeds if self.feeds.get(feed.youtube_id) is feed]
+        await self.bot.db.executemany('INSERT OR REPLACE INTO feeds VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows)
+
+    def schedule(self, feed, delay):
+        feed.next_poll = time.time() + delay
+        self.due.schedule(feed.youtube_id, feed.next_poll)
+
+    async def reload(self, youtube_id):
+        row = await self.bot.db.fetchone('SELECT * FROM feeds WHERE youtube_id = ?', youtube_id)
+        query = 'SELECT channel_id, guild_id FROM subscriptions WHERE youtube_id = ?'
+        subscribers = dict(await self.bot.db.fetchall(query, youtube_id))
+
+        self.subscribers.pop(youtube_id, None)
+        if subscribers:
+            self.subscribers[youtube_id] = subscribers
+
+        if row is None:
+            self.feeds.pop(youtube_id, None)
+            self.due.discard(youtube_id)
+            if self.bot.websub is not None:
+                try:
+                    await self.bot.websub.unsubscribe(youtube_id)
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    pass
+        elif youtube_id not in self.feeds:
+            feed = self.feeds[youtube_id] = Feed(*row)
+            self.due.schedule(youtube_id, feed.next_poll)
+            if self.bot.websub is not None:
+                await self.push_subscribe(youtube_id)
+
+    async def changed(self, youtube_id):
+        # subscriptions made through another process of the cluster have to reach the one polling
+        if self.bot.cluster is not None:
+            await self.bot.cluster.publish('feed_changed', {'youtube_id': youtube_id})
+
+    async def on_cluster_feed_changed(self, data):
+        await self.reload(data['youtube_id'])
+
+    async def poll_loop(self):
+        await self.bot.wait_until_ready()
+        await self.load()
+        if not self.bot.is_primary:
+            return
+
+        while True:
+            batch = [self.feeds[youtube_id] for youtube_id in self.due.pop_due(POLL_BATCH, slack=POLL_SLACK)]
+            if not batch:
+                await self.due.wait()
+                continue
+
+            try:
+                await self.poll(batch)
+            except asyncio.CancelledError:
+                raise
+            except QuotaExceeded as e:
+                for feed in batch:
+                    self.schedule(feed, e.retry_after)
+            except Exception:
+                traceback.print_exc()
+                for feed in batch:
+                    self.schedule(feed, feed.interval)
+
+    async def poll(self, feeds):
+        # one unit tells us which of 50 channels have a new video count
+        params = {'id': ','.join(feed.youtube_id for feed in feeds), 'part': 'statistics'}
+        data = await self.youtube.fetch(None, 'channels', params, Priority.BULK)
+        if data is None:
+            raise RuntimeError('Could not fetch channel statistics.')
+
+        counts = {item['id']: int(item['statistics']['videoCount']) for item in data['items']}
+        now = time.time()
+        changed = [feed for feed in feeds if counts.get(feed.youtube_id, feed.video_count) != feed.video_count]
+        quiet = [feed for feed in feeds if feed not in changed and now - feed.checked_at > RECHECK_INTERVAL]
+        checks = [self.check_uploads(feed) for feed in changed] + [self.check_feed(feed) for feed in quiet]
+        results = await asyncio.gather(*checks, return_exceptions=True)
+
+        # a failed check leaves its feed as it was, so whatever it missed is found on the next poll
+        uploads = {}
+        failed = {}
+        for feed, result in zip(changed + quiet, results):
+            if isinstance(result, QuotaExceeded):
+                failed[feed] = result.retry_after
+            elif isinstance(result, BaseException):
+                if not isinstance(result, (aiohttp.ClientError, asyncio.TimeoutError)):
+                    traceback.print_exception(type(result), result, result.__traceback__)
+                failed[feed] = feed.interval
+            else:
+                uploads[feed] = result
+                feed.checked_at = now
+                for video_id, published in result:
+                    feed.seen.append(video_id)
+                    feed.last_published = published
+
+        for feed in feeds:
+            if feed in failed:
+                self.schedule(feed, failed[feed])
+                continue
+
+            feed.video_count = counts.get(feed.youtube_id, feed.video_count)
+            if uploads.get(feed):
+                feed.interval = max(MIN_INTERVAL, feed.interval / 2)
+            else:
+                feed.interval = min(MAX_INTERVAL, feed.interval * 1.5)
+
+            # pushed feeds are only polled as a rare safety net
+            if self.bot.websub is not None and self.bot.websub.is_subscribed(feed.youtube_id):
+                self.schedule(feed, MAX_INTERVAL)
+            else:
+                self.schedule(feed, feed.interval)
+
+        # state is saved before announcing so a crash can never repeat an announcement
+        await self.save(feeds)
+
+        new = [(feed, video_id) for feed, found in uploads.items() for video_id, _ in found]
+        if new:
+            await self.announce(new)
+
+    async def check_uploads(self, feed):
+        params = {'playlistId': feed.uploads, 'part': 'contentDetails', 'maxResults': 10}
+        data = await self.youtube.fetch(None, 'playlistItems', params, Priority.BULK)
+        if data is None:
+            return []
+
+        details = [item['contentDetails'] for item in reversed(data['items'])]
+        return unseen(feed, [(item['videoId'], item.get('videoPublishedAt', '')) for item in details])
+
+    async def check_feed(self, feed):
+        async with self.bot.session.get(websub.TOPIC_BASE + feed.youtube_id) as r:
+            r.raise_for_status()
+            body = await r.read()
+
+        # newest first, like the uploads playlist
+        entries = await self.bot.loop.run_in_executor(None, websub.parse_feed, body)
+        return unseen(feed, [(entry.video_id, entry.published) for entry in reversed(entries)])
+
+    async def on_websub_entry(self, entry):
+        feed = self.feeds.get(entry.channel_id)
+        if feed is None:
+            return
+
+        published = entry.published[:19]
+        if entry.video_id in feed.seen or published <= feed.last_published:
+            return
+
+        feed.seen.append(entry.video_id)
+        feed.last_published = published
+        await self.save([feed])
+        self.post(feed, entry.video_id, entry.title)
+
+    async def announce(self, uploads):
+        lookups = (self.youtube.lookup('videos', video_id, 'snippet', priority=Priority.BULK) for _, video_id in uploads)
+        videos = await asyncio.gather(*lookups)
+
+        for (feed, video_id), video in zip(uploads, videos):
+            if video is not None:
+                self.post(feed, video_id, video['snippet']['title'])
+
+    def post(self, feed, video_id, title):
+        content = f'**{feed.title}** uploaded **{title}**\n{VIDEO_BASE}{video_id}'
+        subscribers = self.subscribers.get(feed.youtube_id, {})
+        self.bot.post_to(subscribers, content)
+
+        # scheduled streams show up as uploads too, so the same channels hear when they go live
+        livestreams = self.bot.get_cog('Livestreams')
+        if livestreams is not None and subscribers:
+            targets = [(guild_id, channel_id) for channel_id, guild_id in subscribers.items()]
+            self.bot.loop.create_task(livestreams.track(video_id, targets))
+
+    async def resolve(self, ctx, link):
+        match = CHANNEL_REGEX.match(link)
+        if match is None:
+            raise commands.BadArgument('This is not a valid link.')
+
+        part = 'snippet,contentDetails,statistics'
+        channel_id = match.group('channel_id')
+        if channel_id:
+            info = await self.youtube.lookup('channels', channel_id, part, ctx=ctx)
+        else:
+            params = {'forUsername': match.group('username'), 'part': part}
+            data = await self.youtube.request(ctx, 'channels', params)
+            info = data['items'][0] if data and data['items'] else None
+
+        if info is None:
+            raise commands.BadArgument('This is not a valid channel.')
+
+        return info
+
+    @group(invoke_without_command=True)
+    @commands.guild_only()
+    async def notify(self, ctx):
+        """Shows which YouTube channels post uploads in this server."""
+
+        query = 'SELECT subscriptions.channel_id, feeds.title FROM subscriptions ' \
+                'JOIN feeds ON feeds.youtube_id = subscriptions.youtube_id WHERE guild_id = ?'
+        rows = await self.bot.db.fetchall(query, ctx.guild.id)
+        if not rows:
+            return await ctx.send('This server has no upload notifications.')
+
+        entries = [f'{title} \N{RIGHTWARDS ARROW} <#{channel_id}>' for channel_id, title in rows]
+
+        try:
+            paginator = EmbedPaginator(ctx, entries=entries)
+            paginator.embed.title = 'Upload Notifications'
+            paginator.embed.color = 0xFF0000
+            await paginator.paginate()
+        except Exception as e:
+            await ctx.send(e)
+
+    @notify.command(name='add')
+    @commands.guild_only()
+    @commands.has_permissions(manage_guild=True)
+    async def notify_add(self, ctx, channel: discord.TextChannel, link: str):
+        """Posts new uploads from a YouTube channel in a text channel."""
+
+        info = await self.resolve(ctx, link)
+        youtube_id = info['id']
+
+        feed = self.feeds.get(youtube_id)
+        if feed is None:
+            # only uploads published from now on are announced
+            now = datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S')
+            uploads = info['contentDetails']['relatedPlaylists']['uploads']
+            video_count = int(info['statistics']['videoCount'])
+            feed = Feed(youtube_id, info['snippet']['title'], uploads, video_count, now, '', DEFAULT_INTERVAL, 0.0)
+            self.feeds[youtube_id] = feed
+            self.schedule(feed, feed.interval)
+            await self.save([feed])
+            if self.bot.websub is not None:
+                await self.push_subscribe(youtube_id)
+
+        query = 'INSERT OR IGNORE INTO subscriptions VALUES (?, ?, ?)'
+        await self.bot.db.execute(query, ctx.guild.id, channel.id, youtube_id)
+        self.subscribers[youtube_id][channel.id] = ctx.guild.id
+        await self.changed(youtube_id)
+
+        await ctx.send(f'New uploads from **{feed.title}** will be posted in {channel.mention}.')
+
+    @notify.command(name='remove')
+    @commands.guild_only()
+    @commands.has_permissions(manage_guild=True)
+    async def notify_remove(self, ctx, channel: discord.TextChannel, link: str):
+        """Stops posting uploads from a YouTube channel in a text channel."""
+
+        info = await self.resolve(ctx, link)
+        youtube_id = info['id']
+
+        query = 'DELETE FROM subscriptions WHERE channel_id = ? AND youtube_id = ?'
+        if not await self.bot.db.execute(query, channel.id, youtube_id):
+            return await ctx.send(f'Uploads from this channel are not posted in {channel.mention}.')
+
+        subscribers = self.subscribers[youtube_id]
+        subscribers.pop(channel.id, None)
+        if not subscribers:
+            del self.subscribers[youtube_id]
+            self.feeds.pop(youtube_id, None)
+            self.due.discard(youtube_id)
+            await self.bot.db.execute('DELETE FROM feeds WHERE youtube_id = ?', youtube_id)
+            if self.bot.websub is not None:
+                try:
+                    await self.bot.websub.unsubscribe(youtube_id)
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    pass
+
+        await self.changed(youtube_id)
+        await ctx.send(f'Uploads from **{info["snippet"]["title"]}** will no longer be posted in {channel.mention}.')
+
+
+def setup(bot):
+    bot.add_cog(Notifications(bot))
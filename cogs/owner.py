@@ -1,9 +1,13 @@
 import io
+import pstats
+import asyncio
+import cProfile
 import inspect
 import textwrap
 import traceback
 from contextlib import redirect_stdout
 
+import discord
 from discord.ext import commands
 
 
@@ -12,6 +16,7 @@ class Owner:
 
     def __init__(self):
         self._last_result = None
+        self._profiling = False
 
     async def __local_check(self, ctx):
         return ctx.author == ctx.bot.owner
@@ -107,6 +112,53 @@ class Owner:
         else:
             await ctx.send('Name set.')
 
+    @commands.command()
+    async def quota(self, ctx, limit: int = 10):
+        """Shows who spends the most YouTube quota."""
+
+        youtube = ctx.bot.get_cog('YouTube')
+        if youtube is None:
+            return await ctx.send('The YouTube cog is not loaded.')
+
+        scheduler = youtube.scheduler
+        ledger = youtube.ledger
+
+        guilds = '\n'.join(f'{ctx.bot.get_guild(guild_id) or guild_id}: {units}'
+                           for guild_id, units in ledger.guild_spent.most_common(limit))
+        users = '\n'.join(f'{ctx.bot.get_user(user_id) or user_id}: {units}'
+                          for user_id, units in ledger.user_spent.most_common(limit))
+
+        embed = discord.Embed(title='YouTube Quota', color=0xFF0000)
+        embed.description = f'{scheduler.remaining}/{scheduler.daily_budget} units left today'
+        embed.add_field(name='Servers', value=guilds or 'None')
+        embed.add_field(name='Users', value=users or 'None')
+        await ctx.send(embed=embed)
+
+    @commands.command()
+    async def profile(self, ctx, seconds: float = 30.0, limit: int = 50):
+        """Profiles the bot for a while and uploads its hottest functions."""
+
+        if self._profiling:
+            return await ctx.send('A profile is already running.')
+
+        seconds = max(1.0, min(seconds, 300.0))
+        await ctx.send(f'Profiling for {seconds:g} seconds...')
+
+        # everything the event loop runs meanwhile is profiled, not just this command
+        profiler = cProfile.Profile()
+        self._profiling = True
+        profiler.enable()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            profiler.disable()
+            self._profiling = False
+
+        stream = io.StringIO()
+        pstats.Stats(profiler, stream=stream).sort_stats('tottime').print_stats(limit)
+        data = io.BytesIO(stream.getvalue().encode('utf8'))
+        await ctx.send(file=discord.File(data, 'profile.txt'))
+
     @commands.command()
     async def logout(self, ctx):
         """Logs out of the bot."""
@@ -0,0 +1,66 @@
+from discord.ext import commands
+
+from utils import group
+
+MAX_PREFIXES = 10
+
+
+class Settings:
+    async def __error(self, ctx, exception):
+        if isinstance(exception, (commands.BadArgument, commands.CheckFailure)):
+            await ctx.send(exception)
+
+    async def set_prefixes(self, ctx, prefixes):
+        await ctx.bot.db.execute('DELETE FROM prefixes WHERE guild_id = ?', ctx.guild.id)
+        rows = [(ctx.guild.id, prefix) for prefix in prefixes]
+        await ctx.bot.db.executemany('INSERT INTO prefixes VALUES (?, ?)', rows)
+        ctx.bot.index_prefixes(ctx.guild.id, prefixes)
+
+    @group(invoke_without_command=True)
+    @commands.guild_only()
+    async def prefix(self, ctx):
+        """Shows the command prefixes for this server."""
+
+        prefixes = ctx.bot.command_prefix(ctx.bot, ctx.message)
+        await ctx.send('Prefixes: ' + ', '.join(f'`{prefix}`' for prefix in prefixes))
+
+    @prefix.command(name='add')
+    @commands.guild_only()
+    @commands.has_permissions(manage_guild=True)
+    async def prefix_add(self, ctx, prefix: str):
+        """Adds a command prefix for this server.
+
+        The default prefix stops working once a server has its own.
+        Wrap the prefix in quotes to end it with a space.
+        """
+
+        prefixes = list(ctx.bot.prefixes.get(ctx.guild.id, ()))
+        if prefix in prefixes:
+            return await ctx.send('This server already has that prefix.')
+
+        if len(prefixes) >= MAX_PREFIXES:
+            return await ctx.send(f'A server can only have {MAX_PREFIXES} prefixes.')
+
+        await self.set_prefixes(ctx, prefixes + [prefix])
+        await ctx.send(f'Added prefix `{prefix}`.')
+
+    @prefix.command(name='remove')
+    @commands.guild_only()
+    @commands.has_permissions(manage_guild=True)
+    async def prefix_remove(self, ctx, prefix: str):
+        """Removes a command prefix from this server.
+
+        Removing the last one brings back the default prefix.
+        """
+
+        prefixes = list(ctx.bot.prefixes.get(ctx.guild.id, ()))
+        if prefix not in prefixes:
+            return await ctx.send('This server does not have that prefix.')
+
+        prefixes.remove(prefix)
+        await self.set_prefixes(ctx, prefixes)
+        await ctx.send(f'Removed prefix `{prefix}`.')
+
+
+def setup(bot):
+    bot.add_cog(Settings())
@@ -1,11 +1,21 @@
 import io
 import re
+import csv
+import gzip
+import json
+import time
+import shutil
+import asyncio
+import tempfile
+import functools
+import itertools
+import collections
 
 import discord
 from discord.ext import commands
 import dateutil.parser
 
-from utils import Paginator, group
+from utils import transport, Paginator, EmbedPaginator, ResponseCache, RevalidationStats, QuotaScheduler, QuotaLedger, QuotaExceeded, Priority, SingleFlight, Batcher, group
 
 API_BASE = 'https://www.googleapis.com/youtube/v3/'
 YOUTUBE_BASE = 'https://www.youtube.com/'
@@ -13,15 +23,194 @@ VIDEO_BASE = YOUTUBE_BASE + 'watch?v='
 CHANNEL_BASE = YOUTUBE_BASE + 'channel/'
 PLAYLIST_BASE = YOUTUBE_BASE + 'playlist?list='
 
-VIDEO_REGEX = re.compile(r'https?://(?:www\.youtube\.com/watch\?.*v=|youtu\.be/)(?P<video_id>[\w-]+)')
+# query strings stop at whitespace and the punctuation links get wrapped in, so a pattern never runs into the next link
+VIDEO_REGEX = re.compile(r'https?://(?:www\.youtube\.com/watch\?[^\s,<>"\']*v=|youtu\.be/)(?P<video_id>[\w-]+)')
 CHANNEL_REGEX = re.compile(r'https?://www\.youtube\.com/(?:channel/(?P<channel_id>[\w-]+)|user/(?P<username>[\w-]+))')
-PLAYLIST_REGEX = re.compile(r'https?://(?:www\.youtube\.com/(?:watch|playlist)\?|youtu\.be/).*list=(?P<playlist_id>[\w-]+)')
+PLAYLIST_REGEX = re.compile(r'https?://(?:www\.youtube\.com/(?:watch|playlist)\?|youtu\.be/)[^\s,<>"\']*'
+                            r'list=(?P<playlist_id>[\w-]+)')
+
+# seconds a response stays cached, per route
+CACHE_TTLS = {
+    'search': 60,
+    'videos': 300,
+    'playlistItems': 600,
+    'playlists': 3600,
+    'channels': 3600,
+}
+
+# partial responses with only what the commands read, since a full snippet is mostly thumbnails and localizations
+# responses are cached and shared between commands, so each mask covers every command using the route
+FIELD_MASKS = {
+    'search': 'etag,nextPageToken,pageInfo/totalResults,items(kind,id,snippet(title,channelTitle,description))',
+    'videos': 'etag,items(etag,kind,id,snippet(publishedAt,title,description,channelTitle,thumbnails/default/url),'
+              'statistics,contentDetails/duration,'
+              'liveStreamingDetails(actualStartTime,actualEndTime,scheduledStartTime,concurrentViewers))',
+    'playlistItems': 'etag,nextPageToken,pageInfo/totalResults,items/contentDetails(videoId,videoPublishedAt)',
+    'playlists': 'etag,items(etag,kind,id,snippet(publishedAt,title,description,channelTitle,thumbnails/default/url),'
+                 'contentDetails/itemCount)',
+    'channels': 'etag,items(etag,kind,id,snippet(publishedAt,title,description,thumbnails/high/url),'
+                'statistics(viewCount,subscriberCount,videoCount),contentDetails/relatedPlaylists/uploads)',
+}
+
+# how long stale responses are kept around to be revalidated with their ETag
+STALE_MAX_AGE = 24 * 60 * 60
+
+# seconds between progress updates while dumping a playlist
+DUMP_PROGRESS_INTERVAL = 2.0
+
+# what each playlist looked like when it was last dumped, one row per page
+SNAPSHOT_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS playlist_pages (
+    playlist_id TEXT,
+    page INTEGER,
+    etag TEXT,
+    next_page_token TEXT,
+    video_ids TEXT,
+    synced_at REAL,
+    PRIMARY KEY (playlist_id, page)
+);
+'''
+
+# returned by fetch when a response the caller keeps itself has not changed
+NOT_MODIFIED = object()
+
+# videos come first so a watch link inside a playlist counts as the video
+LINK_REGEX = re.compile('|'.join(f'(?:{regex.pattern})' for regex in (VIDEO_REGEX, PLAYLIST_REGEX, CHANNEL_REGEX)))
+
+# link group -> kind, route, part and url base, with the same parts the single info commands use
+BULK_KINDS = {
+    'video_id': ('video', 'videos', 'snippet,statistics', VIDEO_BASE),
+    'playlist_id': ('playlist', 'playlists', 'snippet,contentDetails', PLAYLIST_BASE),
+    'channel_id': ('channel', 'channels', 'snippet,statistics', CHANNEL_BASE),
+}
+
+BULK_FIELDS = ('kind', 'id', 'found', 'url', 'title', 'channel', 'published',
+               'views', 'likes', 'comments', 'subscribers', 'videos')
+MAX_BULK_LINKS = 1000
+MAX_BULK_ATTACHMENT = 1024**2
+
+
+def extract_ids(text):
+    """Finds every link in text, deduplicated and grouped by the kind of ID it holds."""
+
+    found = {group: {} for group in ('video_id', 'playlist_id', 'channel_id', 'username')}
+    for match in LINK_REGEX.finditer(text):
+        found[match.lastgroup][match.group(match.lastgroup)] = None
+
+    return {group: list(ids) for group, ids in found.items()}
+
+
+def bulk_row(kind, base, link_id, item):
+    row = dict.fromkeys(BULK_FIELDS, '')
+    row.update(kind=kind, id=link_id, found=item is not None)
+    if item is None:
+        return row
+
+    snippet = item['snippet']
+    statistics = item.get('statistics', {})
+    details = item.get('contentDetails', {})
+    row.update(
+        id=item['id'],
+        url=base + item['id'],
+        title=snippet['title'],
+        channel=snippet.get('channelTitle', snippet['title']),
+        published=snippet['publishedAt'],
+        views=statistics.get('viewCount', ''),
+        likes=statistics.get('likeCount', ''),
+        comments=statistics.get('commentCount', ''),
+        subscribers=statistics.get('subscriberCount', ''),
+        videos=statistics.get('videoCount', details.get('itemCount', '')),
+    )
+    return row
+
+
+def rows_to_csv(rows):
+    fp = io.StringIO()
+    writer = csv.DictWriter(fp, BULK_FIELDS)
+    writer.writeheader()
+    writer.writerows(rows)
+    return fp.getvalue().encode('utf8')
+
+
+def rows_to_json(rows):
+    return json.dumps(rows, indent=2).encode('utf8')
+
+
+BULK_FORMATS = {
+    'csv': rows_to_csv,
+    'json': rows_to_json,
+}
+
+DUMP_FIELDS = ('position', 'id', 'url', 'title', 'channel', 'published', 'duration', 'views')
+
+# video detail lookups allowed to run ahead of the rows being written
+DUMP_DETAILS_AHEAD = 4
+
+UPLOAD_LIMIT = 8 * 1024**2
+
+DURATION_REGEX = re.compile(r'P(?:(?P<days>\d+)D)?(?:T(?:(?P<hours>\d+)H)?(?:(?P<minutes>\d+)M)?(?:(?P<seconds>\d+)S)?)?')
+
+
+def parse_duration(text):
+    """Turns an ISO 8601 duration like PT4M13S into seconds."""
+
+    match = DURATION_REGEX.fullmatch(text or '')
+    if match is None:
+        return ''
+
+    parts = {name: int(value or 0) for name, value in match.groupdict().items()}
+    return ((parts['days'] * 24 + parts['hours']) * 60 + parts['minutes']) * 60 + parts['seconds']
+
+
+def dump_row(position, video_id, item):
+    row = dict.fromkeys(DUMP_FIELDS, '')
+    row.update(position=position, id=video_id, url=VIDEO_BASE + video_id)
+
+    # deleted and private videos have no details
+    if item is not None:
+        snippet = item['snippet']
+        row.update(
+            title=snippet['title'],
+            channel=snippet['channelTitle'],
+            published=snippet['publishedAt'],
+            duration=parse_duration(item['contentDetails'].get('duration')),
+        )
+        # hidden when the uploader turned view counts off
+        if 'viewCount' in item['statistics']:
+            row['views'] = int(item['statistics']['viewCount'])
+    return row
+
+
+def dump_csv(rows, header):
+    fp = io.StringIO()
+    writer = csv.DictWriter(fp, DUMP_FIELDS)
+    if header:
+        writer.writeheader()
+    writer.writerows(rows)
+    return fp.getvalue().encode('utf8')
+
+
+def dump_jsonl(rows, header):
+    return ''.join(json.dumps(row) + '\n' for row in rows).encode('utf8')
+
+
+DUMP_FORMATS = {
+    'txt': None,
+    'csv': dump_csv,
+    'jsonl': dump_jsonl,
+}
+
+
+def gzip_file(source, destination):
+    with gzip.GzipFile(fileobj=destination, mode='wb') as compressed:
+        shutil.copyfileobj(source, compressed)
 
 
 class Query(commands.Converter):
     def __init__(self, *, multi=True, **kwargs):
         self.multi = multi
-        self.params = {'part': 'id'}
+        # search costs the same whatever parts are asked for, and the snippets feed the local index
+        self.params = {'part': 'snippet'}
         self.params.update(kwargs)
 
     def parse_argument(self, argument):
@@ -59,15 +248,172 @@ class Query(commands.Converter):
 
 
 class YouTube:
+    def __init__(self, bot):
+        self.bot = bot
+        self.cache = ResponseCache(ttls=CACHE_TTLS)
+        self.scheduler = QuotaScheduler(daily_budget=bot.youtube_quota, shared=bot.cluster)
+        self.ledger = QuotaLedger(self.scheduler, guild_budget=bot.guild_quota,
+                                  user_budget=bot.user_quota, weights=bot.guild_weights)
+        self.in_flight = SingleFlight()
+        self.revalidation = RevalidationStats()
+        self.batchers = {}
+
+        metrics = bot.metrics
+        self.api_latency = metrics.histogram('youtube_api_request_seconds', 'YouTube API latency.',
+                                             labels=('route', 'status'))
+        self.response_bytes = metrics.histogram('youtube_api_response_bytes', 'Decoded size of YouTube API responses.',
+                                                labels=('route', 'encoding'), buckets=transport.BYTES_BUCKETS)
+        metrics.callback('youtube_quota_spent_units', 'Quota units spent in the last day.',
+                         lambda: self.scheduler.daily_budget - self.scheduler.remaining)
+        metrics.callback('youtube_quota_refused_total', 'Requests refused to protect the quota.',
+                         lambda: self.scheduler.refused, kind='counter')
+        metrics.callback('youtube_cache_requests_total', 'Response cache lookups.',
+                         lambda: {('hit',): self.cache.hits, ('miss',): self.cache.misses},
+                         labels=('result',), kind='counter')
+        metrics.callback('youtube_cache_bytes', 'Size of the response cache.', lambda: self.cache.size)
+        metrics.callback('youtube_revalidated_total', 'Stale responses the API confirmed unchanged.',
+                         lambda: self.revalidation.revalidated, kind='counter')
+        metrics.callback('youtube_revalidation_saved_bytes_total', 'Response bytes not downloaded thanks to ETags.',
+                         lambda: self.revalidation.bytes_saved, kind='counter')
+        metrics.callback('youtube_revalidation_saved_seconds_total', 'Latency saved by ETag revalidation.',
+                         lambda: self.revalidation.seconds_saved, kind='counter')
+        self.local_searches = metrics.counter('youtube_local_searches_total', 'Searches tried on the local index.',
+                                              labels=('result',))
+
+        self._snapshots_ready = False
+        bot.loop.create_task(self.warm_cache())
+
     async def __error(self, ctx, exception):
-        if isinstance(exception, commands.BadArgument):
+        if isinstance(exception, (commands.BadArgument, QuotaExceeded)):
             await ctx.send(exception)
 
-    async def request(self, ctx, route, params):
-        params['key'] = ctx.bot.youtube_key
-        async with ctx.session.get(API_BASE + route, params=params) as r:
-            if r.status == 200:
-                return await r.json()
+    async def warm_cache(self):
+        rows = await self.bot.api_store.load(max_age=STALE_MAX_AGE, limit=self.cache.max_entries)
+
+        # oldest first so the newest entries end up most recently used
+        now = time.time()
+        for key, body, fetched_at, etag in reversed(rows):
+            self.cache.put(key, transport.loads(body), len(body), age=now - fetched_at)
+
+    async def load_shared(self, key):
+        # the processes of a cluster share one disk cache, so another one may have fetched this already
+        row = await self.bot.api_store.get(key)
+        if row is None:
+            return None
+
+        body, fetched_at, _ = row
+        data = transport.loads(body)
+        age = time.time() - fetched_at
+        self.cache.put(key, data, len(body), age=age)
+        if age < self.cache.ttl(key[0]):
+            return data
+
+    def store(self, key, data, body):
+        self.cache.put(key, data, len(body))
+        self.bot.api_store.put(key, body, etag=data.get('etag'))
+
+    async def request(self, ctx, route, params, *, priority=Priority.INFO):
+        key = self.cache.make_key(route, params)
+        data = self.cache.get(key)
+        if data is not None:
+            return data
+
+        if self.bot.cluster is not None:
+            data = await self.load_shared(key)
+            if data is not None:
+                return data
+
+        if ctx is not None:
+            self.ledger.charge(ctx, self.scheduler.cost(route))
+
+        return await self.in_flight.do(key, lambda: self.fetch(key, route, params, priority))
+
+    async def lookup(self, route, item_id, part, *, ctx=None, priority=Priority.INFO):
+        key = self.cache.make_key(route, {'id': item_id, 'part': part})
+        data = self.cache.get(key)
+        if data is None and self.bot.cluster is not None:
+            data = await self.load_shared(key)
+        # a revalidated entry for a deleted or private item has no items
+        if data is not None:
+            return data['items'][0] if data['items'] else None
+
+        # a stale copy with an ETag is cheaper to revalidate on its own than to refetch in a batch
+        stale = self.cache.peek(key)
+        if stale and 'etag' in stale[0]:
+            data = await self.request(ctx, route, {'id': item_id, 'part': part}, priority=priority)
+            return data['items'][0] if data and data['items'] else None
+
+        if ctx is not None:
+            self.ledger.charge(ctx, self.scheduler.cost(route))
+
+        batcher = self.batchers.get((route, part, priority))
+        if batcher is None:
+            load_many = functools.partial(self.fetch_many, route, part, priority=priority)
+            batcher = self.batchers[route, part, priority] = Batcher(load_many)
+
+        return await batcher.load(item_id)
+
+    async def fetch_many(self, route, part, ids, priority):
+        params = {'id': ','.join(ids), 'part': part}
+        data = await self.fetch(None, route, params, priority)
+        if data is None:
+            return {}
+
+        # cache every item as if it had been requested on its own
+        items = {}
+        for item in data['items']:
+            items[item['id']] = item
+            key = self.cache.make_key(route, {'id': item['id'], 'part': part})
+            single = {'items': [item]}
+            # the item's own ETag is what lets lookup revalidate this entry once it goes stale
+            if 'etag' in item:
+                single['etag'] = item['etag']
+            self.store(key, single, transport.dumps(single))
+
+        return items
+
+    async def fetch(self, key, route, params, priority, *, etag=None):
+        headers = dict(transport.API_HEADERS)
+        stale = key and self.cache.peek(key)
+        if stale and 'etag' in stale[0]:
+            etag = stale[0]['etag']
+        if etag is not None:
+            headers['If-None-Match'] = etag
+
+        await self.scheduler.acquire(route, priority)
+        status = 'error'
+        start = time.monotonic()
+        try:
+            query = dict(params, key=self.bot.youtube_key)
+            if route in FIELD_MASKS:
+                query['fields'] = FIELD_MASKS[route]
+
+            async with self.bot.session.get(API_BASE + route, params=query, headers=headers) as r:
+                status = str(r.status)
+                if r.status == 304:
+                    # callers passing their own ETag keep their own copy of the response
+                    if not stale:
+                        self.revalidation.record_not_modified(route, time.monotonic() - start, 0)
+                        return NOT_MODIFIED
+
+                    data, size = stale
+                    self.revalidation.record_not_modified(route, time.monotonic() - start, size)
+                    self.cache.put(key, data, size)
+                    self.bot.api_store.touch(key)
+                    return data
+
+                if r.status == 200:
+                    body = await r.read()
+                    self.revalidation.record_full(route, time.monotonic() - start)
+                    self.response_bytes.observe(len(body), route, r.headers.get('Content-Encoding', 'identity'))
+                    data = transport.loads(body)
+                    if key is not None:
+                        self.store(key, data, body)
+                    self.bot.search_index.add(data.get('items', ()))
+                    return data
+        finally:
+            self.scheduler.release()
+            self.api_latency.observe(time.monotonic() - start, route, status)
 
     @group(usage='[amount=1] <query>', invoke_without_command=True)
     async def search(self, ctx, *, params: Query(type='video')):
@@ -97,6 +443,28 @@ class YouTube:
 
         await self.show_entries(ctx, params)
 
+    @search.command(name='local', usage='[amount=1] <query>')
+    async def search_local(self, ctx, *, argument: str):
+        """Searches the videos, channels and playlists the bot has already seen.
+
+        This does not use any of the YouTube quota.
+        """
+
+        query, limit = Query().parse_argument(argument)
+        results = await self.bot.search_index.search(query, limit=limit)
+        if not results:
+            return await ctx.send('Nothing I have seen matches that.')
+
+        await self.show_local(ctx, results)
+
+    async def show_local(self, ctx, results):
+        links = [globals()[f'{kind.upper()}_BASE'] + item_id for kind, item_id, _ in results]
+        try:
+            paginator = Paginator(ctx, entries=links)
+            await paginator.paginate()
+        except Exception as e:
+            await ctx.send(e)
+
     @group(invoke_without_command=True)
     async def info(self, ctx, link: str):
         """Gets info from your YouTube link.
@@ -111,18 +479,10 @@ class YouTube:
 
         video_id = match.group('video_id')
 
-        params = {
-        	    'id': video_id,
-        	    'part': 'snippet,statistics',
-        	}
-
-        data = await self.request(ctx, 'videos', params)
-
-        items = data['items']
-        if not items:
+        info = await self.lookup('videos', video_id, 'snippet,statistics', ctx=ctx)
+        if info is None:
             return await ctx.send('This is not a valid channel.')
 
-        info = items[0]
         snippet = info['snippet']
         statistics = info['statistics']
 
@@ -154,17 +514,16 @@ class YouTube:
         channel_id = match.group('channel_id')
         username = match.group('username')
 
-        params = {'id': channel_id} if channel_id else {'forUsername': username}
-        params['part'] = 'snippet,statistics'
+        if channel_id:
+            info = await self.lookup('channels', channel_id, 'snippet,statistics', ctx=ctx)
+        else:
+            params = {'forUsername': username, 'part': 'snippet,statistics'}
+            data = await self.request(ctx, 'channels', params)
+            info = data['items'][0] if data and data['items'] else None
 
-
-        data = await self.request(ctx, 'channels', params)
-
-        items = data['items']
-        if not items:
+        if info is None:
             return await ctx.send('This is not a valid channel.')
 
-        info = items[0]
         snippet = info['snippet']
         statistics = info['statistics']
 
@@ -195,17 +554,10 @@ class YouTube:
 
         playlist_id = match.group('playlist_id')
 
-        params = {
-            'part': 'snippet,contentDetails',
-            'id': playlist_id,
-        }
-        data = await self.request(ctx, 'playlists', params)
-
-        items = data['items']
-        if not items:
+        info = await self.lookup('playlists', playlist_id, 'snippet,contentDetails', ctx=ctx)
+        if info is None:
             return await ctx.send('This is not a valid playlist.')
 
-        info = items[0]
         snippet = info['snippet']
         details = info['contentDetails']
 
@@ -223,70 +575,380 @@ class YouTube:
 
         await ctx.send(embed=embed)
 
-    @commands.command(aliases=['pldump'])
-    async def dump(self, ctx, link: str):
-        """Gets all the URLs from a YouTube playlist."""
+    @info.command(name='bulk', usage='[csv|json] [links...]')
+    async def info_bulk(self, ctx, *, text: str = ''):
+        """Gets info for many links at once as a file.
+
+        Links can be given after the command or in an attached text file.
+        """
+
+        words = text.split(None, 1)
+        file_format = 'csv'
+        if words and words[0].lower() in BULK_FORMATS:
+            file_format = words[0].lower()
+            text = words[1] if len(words) > 1 else ''
+
+        if ctx.message.attachments:
+            text += '\n' + await self.read_attachment(ctx.message.attachments[0])
+
+        ids = extract_ids(text)
+        total = sum(map(len, ids.values()))
+        if not total:
+            return await ctx.send('No YouTube links found.')
+
+        if total > MAX_BULK_LINKS:
+            return await ctx.send(f'You can only look up {MAX_BULK_LINKS} links at once.')
+
+        async with ctx.typing():
+            rows = await self.bulk_lookup(ctx, ids)
+
+        found = sum(row['found'] for row in rows)
+        data = BULK_FORMATS[file_format](rows)
+        await ctx.send(f'Found {found}/{total} links.', file=discord.File(io.BytesIO(data), f'info.{file_format}'))
+
+    async def read_attachment(self, attachment):
+        if attachment.size > MAX_BULK_ATTACHMENT:
+            raise commands.BadArgument('That file is too big.')
+
+        async with self.bot.session.get(attachment.url) as r:
+            if r.status != 200:
+                raise commands.BadArgument('Could not download that file.')
+            return (await r.read()).decode('utf8', 'replace')
+
+    async def bulk_lookup(self, ctx, ids):
+        groups = [group for group in BULK_KINDS if ids[group]]
+        lookups = [self.lookup_many(ctx, BULK_KINDS[group][1], BULK_KINDS[group][2], ids[group]) for group in groups]
+        lookups.extend(self.request(ctx, 'channels', {'forUsername': username, 'part': 'snippet,statistics'},
+                                    priority=Priority.BULK)
+                       for username in ids['username'])
+        results = await asyncio.gather(*lookups)
+
+        rows = []
+        for group, items in zip(groups, results):
+            kind, _, _, base = BULK_KINDS[group]
+            rows.extend(bulk_row(kind, base, item_id, items.get(item_id)) for item_id in ids[group])
+
+        for username, data in zip(ids['username'], results[len(groups):]):
+            item = data['items'][0] if data and data['items'] else None
+            rows.append(bulk_row('channel', CHANNEL_BASE, username, item))
+
+        return rows
+
+    async def lookup_many(self, ctx, route, part, item_ids):
+        items = {}
+        missing = []
+        for item_id in item_ids:
+            data = self.cache.get(self.cache.make_key(route, {'id': item_id, 'part': part}))
+            if data is not None and data['items']:
+                items[item_id] = data['items'][0]
+            else:
+                missing.append(item_id)
+
+        # charged up front so running out of budget never leaves half the lookups done
+        chunks = [missing[i:i + 50] for i in range(0, len(missing), 50)]
+        if chunks:
+            self.ledger.charge(ctx, self.scheduler.cost(route) * len(chunks))
+
+        for result in await asyncio.gather(*(self.fetch_many(route, part, chunk, Priority.BULK) for chunk in chunks)):
+            items.update(result)
+
+        return items
+
+    @commands.command(aliases=['pldump'], usage='[txt|csv|jsonl] <link>')
+    async def dump(self, ctx, *, arguments: str):
+        """Gets all the URLs from a YouTube playlist.
+
+        The csv and jsonl formats add each video's title, channel, duration and views.
+        """
+
+        words = arguments.split()
+        file_format = 'txt'
+        if len(words) > 1 and words[0].lower() in DUMP_FORMATS:
+            file_format = words.pop(0).lower()
+
+        match = PLAYLIST_REGEX.match(words[0])
+        if match is None:
+            return await ctx.send('This is not a valid link.')
+
+        playlist_id = match.group(1)
+
+        status = None
+        last_update = time.monotonic()
+        count = 0
+        # (position, video ids, task fetching their details) in playlist order
+        pending = collections.deque()
+
+        # rows go straight to disk so only a few pages are ever held in memory
+        with tempfile.TemporaryFile() as fp:
+            try:
+                async for video_ids, total in self.sync_playlist(ctx, playlist_id):
+                    if not video_ids:
+                        continue
+
+                    if file_format == 'txt':
+                        if count:
+                            fp.write(b'\r\n')
+                        fp.write('\r\n'.join(VIDEO_BASE + video_id for video_id in video_ids).encode('utf8'))
+                    else:
+                        # details are fetched while the next page is, and written once everything before is
+                        self.ledger.charge(ctx, self.scheduler.cost('videos'))
+                        task = self.bot.loop.create_task(self.video_details(video_ids))
+                        pending.append((count, video_ids, task))
+                        while pending and (len(pending) > DUMP_DETAILS_AHEAD or pending[0][2].done()):
+                            await self.write_rows(fp, file_format, *pending.popleft())
+
+                    count += len(video_ids)
+
+                    if count < total and time.monotonic() - last_update > DUMP_PROGRESS_INTERVAL:
+                        content = f'Fetched {count}/{total} videos...'
+                        if status is None:
+                            status = await ctx.send(content)
+                        else:
+                            await status.edit(content=content)
+                        last_update = time.monotonic()
+
+                while pending:
+                    await self.write_rows(fp, file_format, *pending.popleft())
+            finally:
+                for _, _, task in pending:
+                    task.cancel()
+
+            if status is not None:
+                try:
+                    await status.delete()
+                except discord.HTTPException:
+                    pass
+
+            if not count:
+                return await ctx.send('This is not a valid playlist.')
+
+            if fp.seek(0, io.SEEK_END) <= UPLOAD_LIMIT:
+                fp.seek(0)
+                return await ctx.send(file=discord.File(fp, f'playlist.{file_format}'))
+
+            with tempfile.TemporaryFile() as compressed:
+                fp.seek(0)
+                await self.bot.loop.run_in_executor(None, gzip_file, fp, compressed)
+                if compressed.tell() > UPLOAD_LIMIT:
+                    return await ctx.send('This playlist is too big to upload, even compressed.')
+
+                compressed.seek(0)
+                await ctx.send(file=discord.File(compressed, f'playlist.{file_format}.gz'))
+
+    @commands.command(aliases=['pldiff'])
+    async def diff(self, ctx, link: str):
+        """Shows the videos added to and removed from a playlist since it was last dumped or diffed."""
 
         match = PLAYLIST_REGEX.match(link)
         if match is None:
             return await ctx.send('This is not a valid link.')
 
         playlist_id = match.group(1)
+        _, snapshot = await self.load_snapshot(playlist_id)
 
-        params = {
-            'part': 'contentDetails',
-            'playlistId': playlist_id
-        }
-        entries = await self.get_entries(ctx, 'playlistItems', params, all_entries=True)
-        if not entries:
+        video_ids = []
+        async with ctx.typing():
+            async for page, _ in self.sync_playlist(ctx, playlist_id, max_age=0):
+                video_ids.extend(page)
+
+        if not video_ids:
             return await ctx.send('This is not a valid playlist.')
 
-        links = [VIDEO_BASE + entry['contentDetails']['videoId'] for entry in entries]
+        if not snapshot:
+            return await ctx.send(f'This playlist has {len(video_ids)} videos, '
+                                  'run this again later to see what changed.')
 
-        file = io.BytesIO('\r\n'.join(links).encode('utf8'))
-        await ctx.send(file=discord.File(file, 'playlist.txt'))
+        # dicts keep playlist order and drop the duplicates a playlist can have
+        old_ids = dict.fromkeys(itertools.chain.from_iterable(video_ids for _, _, video_ids in snapshot))
+        new_ids = dict.fromkeys(video_ids)
+        added = [f'\N{HEAVY PLUS SIGN} {VIDEO_BASE}{video_id}' for video_id in new_ids if video_id not in old_ids]
+        removed = [f'\N{HEAVY MINUS SIGN} {VIDEO_BASE}{video_id}' for video_id in old_ids if video_id not in new_ids]
 
-    async def get_entries(self, ctx, search_type, params, *, all_entries=False):
-        entries = []
+        if not added and not removed:
+            return await ctx.send('No videos were added or removed.')
+
+        try:
+            paginator = EmbedPaginator(ctx, entries=added + removed)
+            paginator.embed.title = f'{len(added)} added, {len(removed)} removed'
+            paginator.embed.color = 0xFF0000
+            await paginator.paginate()
+        except Exception as e:
+            await ctx.send(e)
+
+    async def load_snapshot(self, playlist_id):
+        if not self._snapshots_ready:
+            await self.bot.db.executescript(SNAPSHOT_SCHEMA)
+            self._snapshots_ready = True
+
+        query = 'SELECT etag, next_page_token, video_ids, synced_at FROM playlist_pages WHERE playlist_id = ? ORDER BY page'
+        rows = await self.bot.db.fetchall(query, playlist_id)
+        if not rows:
+            return None, []
+
+        pages = [(etag, next_page_token, video_ids.split(',') if video_ids else [])
+                 for etag, next_page_token, video_ids, _ in rows]
+        return rows[0][3], pages
+
+    @staticmethod
+    def _replace_snapshot(db, playlist_id, rows):
+        with db:
+            db.execute('DELETE FROM playlist_pages WHERE playlist_id = ?', (playlist_id,))
+            db.executemany('INSERT INTO playlist_pages VALUES (?, ?, ?, ?, ?, ?)', rows)
+
+    async def save_snapshot(self, playlist_id, pages):
+        synced_at = time.time()
+        rows = [(playlist_id, number, etag, next_page_token, ','.join(video_ids), synced_at)
+                for number, (etag, next_page_token, video_ids) in enumerate(pages)]
+        await self.bot.db.run(self._replace_snapshot, playlist_id, rows)
+
+    async def sync_playlist(self, ctx, playlist_id, *, max_age=None):
+        """Yields the video IDs in a playlist a page at a time, along with the playlist's size.
+
+        A snapshot younger than max_age, by default the playlistItems cache TTL, is used as is.
+        Older pages are revalidated with their ETags rather than downloaded again.
+        The new snapshot is saved once every page has been read.
+        """
+
+        synced_at, snapshot = await self.load_snapshot(playlist_id)
+        known_total = sum(len(video_ids) for _, _, video_ids in snapshot)
+        if max_age is None:
+            max_age = self.cache.ttl('playlistItems')
+
+        if snapshot and time.time() - synced_at < max_age:
+            for _, _, video_ids in snapshot:
+                yield video_ids, known_total
+            return
+
+        params = {'part': 'contentDetails', 'playlistId': playlist_id, 'maxResults': 50}
+        cost = self.scheduler.cost('playlistItems')
+
+        def fetch_page(page_token, etag=None):
+            page_params = dict(params, pageToken=page_token) if page_token else dict(params)
+            coro = self.fetch(None, 'playlistItems', page_params, Priority.BULK, etag=etag)
+            return self.bot.loop.create_task(coro)
+
+        # page tokens are positions in the playlist, so all the known pages can be checked at once
+        page_tokens = [None] + [next_page_token for _, next_page_token, _ in snapshot[:-1]]
+        tasks = []
+        pages = []
+        try:
+            # pages are charged as they are read, the ones left over are cancelled below
+            tasks.extend(fetch_page(page_token, etag) for page_token, (etag, _, _) in zip(page_tokens, snapshot))
+
+            page_token = None
+            for number, task in enumerate(tasks):
+                # the page before came back different, so this one was asked for with the wrong token
+                if page_tokens[number] != page_token:
+                    break
+
+                self.ledger.charge(ctx, cost)
+                data = await task
+                if data is None:
+                    return
+
+                if data is NOT_MODIFIED:
+                    page = snapshot[number]
+                    total = known_total
+                else:
+                    video_ids = [item['contentDetails']['videoId'] for item in data['items']]
+                    page = (data.get('etag'), data.get('nextPageToken'), video_ids)
+                    total = data['pageInfo']['totalResults']
+
+                pages.append(page)
+                yield page[2], total
+
+                page_token = page[1]
+                if page_token is None:
+                    break
+
+            # whatever is past the snapshot, or all of a playlist seen for the first time
+            while page_token is not None or not pages:
+                self.ledger.charge(ctx, cost)
+                data = await fetch_page(page_token)
+                if data is None:
+                    return
+
+                video_ids = [item['contentDetails']['videoId'] for item in data['items']]
+                page_token = data.get('nextPageToken')
+                pages.append((data.get('etag'), page_token, video_ids))
+                yield video_ids, data['pageInfo']['totalResults']
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        await self.save_snapshot(playlist_id, pages)
+
+    async def video_details(self, video_ids):
+        # not cached, a dump would only push everything else out of the cache
+        params = {'id': ','.join(video_ids), 'part': 'snippet,contentDetails,statistics'}
+        data = await self.fetch(None, 'videos', params, Priority.BULK)
+        return {item['id']: item for item in data['items']} if data else {}
+
+    async def write_rows(self, fp, file_format, position, video_ids, task):
+        items = await task
+        rows = [dump_row(position + i + 1, video_id, items.get(video_id)) for i, video_id in enumerate(video_ids)]
+        fp.write(DUMP_FORMATS[file_format](rows, header=position == 0))
+
+    async def iter_pages(self, ctx, search_type, params, *, priority=Priority.SEARCH):
         limit = params.get('maxResults')
 
         while True:
-            if all_entries:
-                params['maxResults'] = 50
-            else:
-                params['maxResults'] = min(50, limit)
-                limit = max(0, limit - 50)
+            params['maxResults'] = min(50, limit)
+            limit = max(0, limit - 50)
 
-            data = await self.request(ctx, search_type, params)
+            data = await self.request(ctx, search_type, params, priority=priority)
             if data is None:
-                return entries
+                return
 
-            items = data['items']
-            entries.extend(items)
+            yield data
 
             page_token = data.get('nextPageToken')
 
             if page_token is None or limit == 0:
-                return entries
+                return
 
             params['pageToken'] = page_token
 
     async def show_entries(self, ctx, params):
-        entries = await self.get_entries(ctx, 'search', params)
-
         search_type = params['type']
-        if not entries:
+        base = globals().get(f'{search_type.upper()}_BASE')
+        limit = params['maxResults']
+
+        # the index cannot tell what is live, so livestream searches always go to the API
+        if self.bot.local_search and 'eventType' not in params:
+            results = await self.bot.search_index.search(params['q'], kind=search_type, limit=limit)
+            if len(results) == limit:
+                self.local_searches.inc('hit')
+                return await self.show_local(ctx, results)
+            self.local_searches.inc('miss')
+
+        def get_links(page):
+            return [base + entry['id'][f'{search_type}Id'] for entry in page['items']]
+
+        # only searches that reach the API are charged, request does that before each page is fetched
+        pages = self.iter_pages(ctx, 'search', params)
+        first = None
+        async for first in pages:
+            break
+
+        if not first or not first['items']:
             return await ctx.send(f'No {search_type}s found.')
 
-        base = globals().get(f'{search_type.upper()}_BASE')
-        links = [base + entry['id'][f'{search_type}Id'] for entry in entries]
+        if 'nextPageToken' in first:
+            total = min(limit, first['pageInfo']['totalResults'])
+        else:
+            total = len(first['items'])
+
+        # later pages are only fetched once someone pages close to them
+        async def source():
+            async for page in pages:
+                yield get_links(page)
 
         try:
-            paginator = Paginator(ctx, entries=links)
+            paginator = Paginator(ctx, entries=get_links(first), source=source(), total=total)
             await paginator.paginate()
         except Exception as e:
             await ctx.send(e)
 
-
 def setup(bot):
-    bot.add_cog(YouTube())
+    bot.add_cog(YouTube(bot))
@@ -0,0 +1,86 @@
+"""Runs the bot as several processes, each connected to its own range of shards.
+
+The processes share one YouTube quota budget through this launcher and one
+response cache through the disk cache, so adding processes does not add API spend.
+"""
+
+import os
+import sys
+import asyncio
+
+import aiohttp
+
+import config
+from utils import ClusterServer
+
+GATEWAY_URL = 'https://discordapp.com/api/v7/gateway/bot'
+
+# discord allows one identify every five seconds
+IDENTIFY_DELAY = 5
+RESTART_DELAY = 10
+
+
+async def recommended_shards():
+    headers = {'Authorization': f'Bot {config.token}'}
+    async with aiohttp.ClientSession() as session:
+        async with session.get(GATEWAY_URL, headers=headers) as r:
+            data = await r.json()
+            return data['shards']
+
+
+def split_shards(shard_count, processes):
+    size, extra = divmod(shard_count, processes)
+    ranges = []
+    start = 0
+    for cluster_id in range(processes):
+        end = start + size + (cluster_id < extra)
+        ranges.append(list(range(start, end)))
+        start = end
+
+    return ranges
+
+
+async def run_process(cluster_id, shard_ids, shard_count, url, delay):
+    env = dict(os.environ,
+               YTBOT_CLUSTER_ID=str(cluster_id),
+               YTBOT_SHARD_IDS=','.join(map(str, shard_ids)),
+               YTBOT_SHARD_COUNT=str(shard_count),
+               YTBOT_CLUSTER_URL=url)
+
+    await asyncio.sleep(delay)
+    while True:
+        process = await asyncio.create_subprocess_exec(sys.executable, 'bot.py', env=env)
+        code = await process.wait()
+
+        # the logout command exits cleanly and should stay down
+        if code == 0:
+            return
+
+        print(f'Process {cluster_id} exited with code {code}, restarting in {RESTART_DELAY} seconds.')
+        await asyncio.sleep(RESTART_DELAY)
+
+
+async def main():
+    options = getattr(config, 'cluster', {})
+    shard_count = options.get('shards') or await recommended_shards()
+    processes = min(options.get('processes', os.cpu_count() or 1), shard_count)
+
+    server = ClusterServer(daily_budget=getattr(config, 'youtube_quota', 10000),
+                           port=options.get('port', 8765))
+    await server.start()
+
+    runs = []
+    delay = 0
+    for cluster_id, shard_ids in enumerate(split_shards(shard_count, processes)):
+        runs.append(run_process(cluster_id, shard_ids, shard_count, server.url, delay))
+        delay += IDENTIFY_DELAY * len(shard_ids)
+
+    print(f'Launching {shard_count} shards in {processes} processes.')
+    try:
+        await asyncio.gather(*runs)
+    finally:
+        await server.close()
+
+
+if __name__ == '__main__':
+    asyncio.get_event_loop().run_until_complete(main())
@@ -1,4 +1,15 @@
 from .time import human_time
-from .paginator import Paginator, EmbedPaginator
+from .paginator import Paginator, EmbedPaginator, PaginatorManager
 from .group import group, CaseInsensitiveDict
 from .subprocess import run_subprocess
+from .database import Database
+from .cache import ResponseCache, DiskCache, RevalidationStats
+from .index import SearchIndex
+from .transport import make_session
+from .quota import QuotaScheduler, QuotaLedger, QuotaExceeded, BudgetExhausted, Priority
+from .coalesce import SingleFlight, Batcher
+from .websub import WebSubServer
+from .schedule import DueQueue
+from .metrics import Metrics, MetricsServer, sample_lag
+from .monitor import LoopMonitor
+from .cluster import ClusterServer, ClusterClient
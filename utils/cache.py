@@ -0,0 +1,183 @@
+import json
+import time
+import asyncio
+from collections import OrderedDict
+
+from .database import Database
+
+
+class ResponseCache:
+    def __init__(self, *, ttls=None, default_ttl=300.0, max_entries=1024, max_bytes=16 * 1024**2):
+        self.ttls = ttls or {}
+        self.default_ttl = default_ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    @staticmethod
+    def make_key(route, params):
+        items = sorted((k, str(v)) for k, v in params.items() if k != 'key')
+        return route, tuple(items)
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def ttl(self, route):
+        return self.ttls.get(route, self.default_ttl)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        # expired entries linger until evicted so they can be revalidated
+        expires, _, data = entry
+        if expires < time.monotonic():
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return data
+
+    def peek(self, key):
+        entry = self._entries.get(key)
+        if entry is not None:
+            return entry[2], entry[1]
+
+    def put(self, key, data, size, *, age=0.0):
+        ttl = self.ttl(key[0])
+        if ttl <= 0 or size > self.max_bytes:
+            return
+
+        self.remove(key)
+        self._entries[key] = (time.monotonic() + ttl - age, size, data)
+        self.size += size
+
+        while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+            _, (_, size, _) = self._entries.popitem(last=False)
+            self.size -= size
+
+    def remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[1]
+
+    def clear(self):
+        self._entries.clear()
+        self.size = 0
+
+
+class DiskCache:
+    def __init__(self, path, *, flush_delay=5.0):
+        self.db = Database(path)
+        self.flush_delay = flush_delay
+        self.writes = 0
+        self._ready = False
+        self._pending = {}
+        self._touched = {}
+        self._handle = None
+
+    @staticmethod
+    def dump_key(key):
+        return json.dumps(key, separators=(',', ':'))
+
+    @staticmethod
+    def load_key(text):
+        route, items = json.loads(text)
+        return route, tuple(tuple(item) for item in items)
+
+    async def _prepare(self):
+        if not self._ready:
+            await self.db.executescript(
+                'CREATE TABLE IF NOT EXISTS responses ('
+                'key TEXT PRIMARY KEY, route TEXT, body BLOB, fetched_at REAL, etag TEXT);'
+                'CREATE INDEX IF NOT EXISTS responses_fetched_at ON responses (fetched_at);'
+            )
+            self._ready = True
+
+    @staticmethod
+    def _write(db, rows, touched):
+        with db:
+            db.executemany('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)', rows)
+            db.executemany('UPDATE responses SET fetched_at = ? WHERE key = ?', touched)
+
+    async def load(self, *, max_age, limit=1024):
+        await self._prepare()
+        await self.db.execute('DELETE FROM responses WHERE fetched_at < ?', time.time() - max_age)
+        query = 'SELECT key, body, fetched_at, etag FROM responses ORDER BY fetched_at DESC LIMIT ?'
+        rows = await self.db.fetchall(query, limit)
+        return [(self.load_key(key), body, fetched_at, etag) for key, body, fetched_at, etag in rows]
+
+    async def get(self, key):
+        # only sees what has been flushed, which for other processes is at most flush_delay behind
+        await self._prepare()
+        query = 'SELECT body, fetched_at, etag FROM responses WHERE key = ?'
+        return await self.db.fetchone(query, self.dump_key(key))
+
+    def put(self, key, body, *, etag=None, fetched_at=None):
+        fetched_at = fetched_at or time.time()
+        self._pending[self.dump_key(key)] = (key[0], body, fetched_at, etag)
+        self._schedule_flush()
+
+    def touch(self, key, *, fetched_at=None):
+        self._touched[self.dump_key(key)] = fetched_at or time.time()
+        self._schedule_flush()
+
+    def _schedule_flush(self):
+        if self._handle is None:
+            loop = asyncio.get_event_loop()
+            self._handle = loop.call_later(self.flush_delay, lambda: asyncio.ensure_future(self.flush()))
+
+    async def flush(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+        pending, self._pending = self._pending, {}
+        touched, self._touched = self._touched, {}
+        if pending or touched:
+            rows = [(key,) + row for key, row in pending.items()]
+            touched = [(fetched_at, key) for key, fetched_at in touched.items()]
+            await self._prepare()
+            await self.db.run(self._write, rows, touched)
+            self.writes += len(rows) + len(touched)
+
+    async def close(self):
+        await self.flush()
+        await self.db.close()
+
+
+class RevalidationStats:
+    def __init__(self, *, smoothing=0.1):
+        self.smoothing = smoothing
+        self.revalidated = 0
+        self.bytes_saved = 0
+        self.seconds_saved = 0.0
+        self.latency = {}
+
+    def record_full(self, route, elapsed):
+        average = self.latency.get(route)
+        if average is None:
+            self.latency[route] = elapsed
+        else:
+            self.latency[route] = average + self.smoothing * (elapsed - average)
+
+    def record_not_modified(self, route, elapsed, size):
+        self.revalidated += 1
+        self.bytes_saved += size
+        average = self.latency.get(route)
+        if average is not None:
+            self.seconds_saved += max(0.0, average - elapsed)
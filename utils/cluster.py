@@ -0,0 +1,186 @@
+import json
+import asyncio
+import itertools
+
+import aiohttp
+from aiohttp import web
+
+from .quota import QuotaScheduler, Priority
+
+# seconds between stats reports, before reconnecting and before giving up on a reply
+STATS_INTERVAL = 15
+RECONNECT_DELAY = 5
+REQUEST_TIMEOUT = 5
+
+
+class ClusterServer:
+    """Runs in the launcher and holds what the bot processes have to agree on."""
+
+    def __init__(self, *, daily_budget=10000, host='127.0.0.1', port=8765):
+        self.scheduler = QuotaScheduler(daily_budget=daily_budget)
+        self.host = host
+        self.port = port
+        self.workers = {}
+        self.stats = {}
+        self._runner = None
+
+        self.app = web.Application()
+        self.app.router.add_get('/ws', self.connect)
+
+    @property
+    def url(self):
+        return f'http://{self.host}:{self.port}/ws'
+
+    async def start(self):
+        self._runner = web.AppRunner(self.app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+
+    async def close(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    async def connect(self, request):
+        cluster_id = int(request.query['cluster_id'])
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.workers[cluster_id] = ws
+
+        try:
+            async for message in ws:
+                if message.type == aiohttp.WSMsgType.TEXT:
+                    await self.handle(cluster_id, ws, json.loads(message.data))
+        finally:
+            if self.workers.get(cluster_id) is ws:
+                del self.workers[cluster_id]
+                self.stats.pop(cluster_id, None)
+
+        return ws
+
+    async def handle(self, cluster_id, ws, payload):
+        op = payload['op']
+        if op == 'reserve':
+            reply = {'delay': self.reserve(payload['units'], Priority(payload['priority']))}
+        elif op == 'cluster_stats':
+            reply = {'stats': list(self.stats.values())}
+        elif op == 'stats':
+            self.stats[cluster_id] = payload['data']
+            return
+        elif op == 'publish':
+            event = json.dumps({'op': 'event', 'event': payload['event'], 'data': payload['data']})
+            for worker_id, worker in list(self.workers.items()):
+                if worker_id != cluster_id and not worker.closed:
+                    await worker.send_str(event)
+            return
+        else:
+            return
+
+        reply.update(op='reply', nonce=payload['nonce'])
+        await ws.send_json(reply)
+
+    def reserve(self, units, priority):
+        delay = self.scheduler.retry_after(units, priority)
+        if not delay:
+            self.scheduler.record(units)
+        return delay
+
+
+class ClusterClient:
+    """Connects one bot process to the launcher's ClusterServer."""
+
+    def __init__(self, bot, url, cluster_id):
+        self.bot = bot
+        self.url = url
+        self.cluster_id = cluster_id
+        self._ws = None
+        self._connected = asyncio.Event()
+        self._replies = {}
+        self._nonces = itertools.count()
+        self._tasks = []
+
+    @property
+    def is_primary(self):
+        return self.cluster_id == 0
+
+    def start(self):
+        self._tasks = [self.bot.loop.create_task(self.connect_loop()),
+                       self.bot.loop.create_task(self.stats_loop())]
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        if self._ws is not None:
+            await self._ws.close()
+
+    async def connect_loop(self):
+        while True:
+            try:
+                async with self.bot.session.ws_connect(self.url, params={'cluster_id': str(self.cluster_id)}) as ws:
+                    self._ws = ws
+                    self._connected.set()
+                    async for message in ws:
+                        if message.type == aiohttp.WSMsgType.TEXT:
+                            self.receive(json.loads(message.data))
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                pass
+            finally:
+                self._ws = None
+                self._connected.clear()
+                for fut in self._replies.values():
+                    if not fut.done():
+                        fut.set_exception(ConnectionError('Lost the connection to the cluster.'))
+
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    def receive(self, payload):
+        if payload['op'] == 'reply':
+            fut = self._replies.get(payload['nonce'])
+            if fut is not None and not fut.done():
+                fut.set_result(payload)
+        elif payload['op'] == 'event':
+            self.bot.dispatch(f'cluster_{payload["event"]}', payload['data'])
+
+    async def send(self, op, **data):
+        await asyncio.wait_for(self._connected.wait(), REQUEST_TIMEOUT)
+        await self._ws.send_json(dict(data, op=op))
+
+    async def request(self, op, **data):
+        nonce = next(self._nonces)
+        fut = self._replies[nonce] = self.bot.loop.create_future()
+        try:
+            await self.send(op, nonce=nonce, **data)
+            return await asyncio.wait_for(fut, REQUEST_TIMEOUT)
+        finally:
+            del self._replies[nonce]
+
+    async def reserve(self, units, priority):
+        # without the launcher each process is still held to its own budget
+        if self._ws is None:
+            return 0.0
+
+        try:
+            reply = await self.request('reserve', units=units, priority=int(priority))
+        except (ConnectionError, asyncio.TimeoutError):
+            return 0.0
+        return reply['delay']
+
+    async def publish(self, event, data):
+        try:
+            await self.send('publish', event=event, data=data)
+        except (ConnectionError, asyncio.TimeoutError):
+            return False
+        return True
+
+    async def cluster_stats(self):
+        reply = await self.request('cluster_stats')
+        return reply['stats']
+
+    async def stats_loop(self):
+        await self.bot.wait_until_ready()
+        while True:
+            try:
+                await self.send('stats', data=self.bot.local_stats())
+            except (ConnectionError, asyncio.TimeoutError):
+                pass
+            await asyncio.sleep(STATS_INTERVAL)
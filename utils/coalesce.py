@@ -0,0 +1,83 @@
+import asyncio
+
+
+class SingleFlight:
+    def __init__(self):
+        self.shared = 0
+        self._calls = {}
+
+    def __len__(self):
+        return len(self._calls)
+
+    def waiters(self):
+        return {key: count for key, (_, count) in self._calls.items()}
+
+    def _done(self, key, task):
+        call = self._calls.get(key)
+        if call is not None and call[0] is task:
+            del self._calls[key]
+
+        # nobody might be left to retrieve it
+        if not task.cancelled():
+            task.exception()
+
+    async def do(self, key, func):
+        call = self._calls.get(key)
+        if call is None:
+            task = asyncio.ensure_future(func())
+            call = self._calls[key] = [task, 0]
+            task.add_done_callback(lambda t: self._done(key, t))
+        else:
+            self.shared += 1
+
+        call[1] += 1
+        try:
+            return await asyncio.shield(call[0])
+        finally:
+            call[1] -= 1
+
+
+class Batcher:
+    def __init__(self, load_many, *, delay=0.005, max_size=50):
+        self.load_many = load_many
+        self.delay = delay
+        self.max_size = max_size
+        self.loads = 0
+        self.batches = 0
+        self._pending = {}
+        self._handle = None
+
+    async def load(self, key):
+        fut = self._pending.get(key)
+        if fut is None:
+            loop = asyncio.get_event_loop()
+            fut = self._pending[key] = loop.create_future()
+            if len(self._pending) >= self.max_size:
+                self.dispatch()
+            elif self._handle is None:
+                self._handle = loop.call_later(self.delay, self.dispatch)
+
+        self.loads += 1
+        return await asyncio.shield(fut)
+
+    def dispatch(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+        pending, self._pending = self._pending, {}
+        if pending:
+            self.batches += 1
+            asyncio.ensure_future(self._run(pending))
+
+    async def _run(self, pending):
+        try:
+            results = await self.load_many(list(pending))
+        except Exception as e:
+            for fut in pending.values():
+                if not fut.done():
+                    fut.set_exception(e)
+        else:
+            for key, fut in pending.items():
+                if not fut.done():
+                    fut.set_result(results.get(key))
@@ -0,0 +1,62 @@
+import asyncio
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Database:
+    def __init__(self, path):
+        self.path = path
+        self._db = None
+        # sqlite connections stay on the thread that created them
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+    def _call(self, func, args):
+        if self._db is None:
+            self._db = sqlite3.connect(self.path)
+            # lets the processes of a cluster read while another one writes
+            self._db.execute('PRAGMA journal_mode=WAL')
+        return func(self._db, *args)
+
+    def run(self, func, *args):
+        loop = asyncio.get_event_loop()
+        return loop.run_in_executor(self._executor, self._call, func, args)
+
+    @staticmethod
+    def _execute(db, query, args):
+        with db:
+            return db.execute(query, args).rowcount
+
+    @staticmethod
+    def _executemany(db, query, rows):
+        with db:
+            db.executemany(query, rows)
+
+    @staticmethod
+    def _fetchall(db, query, args):
+        return db.execute(query, args).fetchall()
+
+    async def execute(self, query, *args):
+        return await self.run(self._execute, query, args)
+
+    async def executemany(self, query, rows):
+        await self.run(self._executemany, query, rows)
+
+    async def executescript(self, script):
+        await self.run(sqlite3.Connection.executescript, script)
+
+    async def fetchall(self, query, *args):
+        return await self.run(self._fetchall, query, args)
+
+    async def fetchone(self, query, *args):
+        rows = await self.fetchall(query, *args)
+        return rows[0] if rows else None
+
+    def _close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    async def close(self):
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(self._executor, self._close)
+        self._executor.shutdown(wait=False)
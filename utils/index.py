@@ -0,0 +1,145 @@
+import re
+import time
+import asyncio
+
+from .database import Database
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS items (
+    rowid INTEGER PRIMARY KEY,
+    item_id TEXT UNIQUE,
+    kind TEXT,
+    title TEXT,
+    channel TEXT,
+    description TEXT,
+    seen_at REAL
+);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5(
+    title, channel, description,
+    content='items', content_rowid='rowid', tokenize='unicode61 remove_diacritics 2'
+);
+
+CREATE TRIGGER IF NOT EXISTS items_insert AFTER INSERT ON items BEGIN
+    INSERT INTO items_fts (rowid, title, channel, description)
+    VALUES (new.rowid, new.title, new.channel, new.description);
+END;
+
+CREATE TRIGGER IF NOT EXISTS items_update AFTER UPDATE OF title, channel, description ON items BEGIN
+    INSERT INTO items_fts (items_fts, rowid, title, channel, description)
+    VALUES ('delete', old.rowid, old.title, old.channel, old.description);
+    INSERT INTO items_fts (rowid, title, channel, description)
+    VALUES (new.rowid, new.title, new.channel, new.description);
+END;
+'''
+
+# the existing row is only rewritten, and reindexed, when its text changed
+UPSERT = '''
+INSERT INTO items (item_id, kind, title, channel, description, seen_at) VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (item_id) DO UPDATE SET
+    title = excluded.title, channel = excluded.channel, description = excluded.description, seen_at = excluded.seen_at
+WHERE title IS NOT excluded.title OR channel IS NOT excluded.channel OR description IS NOT excluded.description
+'''
+
+# titles count the most and descriptions the least
+SEARCH = '''
+SELECT items.kind, items.item_id, items.title FROM items_fts JOIN items ON items.rowid = items_fts.rowid
+WHERE items_fts MATCH ? AND (? IS NULL OR items.kind = ?)
+ORDER BY bm25(items_fts, 10.0, 5.0, 1.0) LIMIT ?
+'''
+
+KINDS = {
+    'youtube#video': 'video',
+    'youtube#channel': 'channel',
+    'youtube#playlist': 'playlist',
+}
+
+WORD_REGEX = re.compile(r'\w+')
+
+
+def item_row(item):
+    snippet = item.get('snippet')
+    if snippet is None:
+        return None
+
+    # search results wrap the id and kind of what they found
+    item_id = item['id']
+    kind = KINDS.get(item['kind'])
+    if isinstance(item_id, dict):
+        kind = KINDS.get(item_id['kind'])
+        item_id = item_id.get(f'{kind}Id')
+
+    if kind is None or item_id is None:
+        return None
+
+    title = snippet.get('title', '')
+    channel = title if kind == 'channel' else snippet.get('channelTitle', '')
+    return item_id, kind, title, channel, snippet.get('description', ''), time.time()
+
+
+def match_expression(text):
+    # every word has to match, the last one as a prefix since people stop typing early
+    words = WORD_REGEX.findall(text)
+    if not words:
+        return None
+
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+class SearchIndex:
+    """A full-text index of the videos, channels and playlists the bot has fetched."""
+
+    def __init__(self, path, *, flush_delay=5.0):
+        self.db = Database(path)
+        self.flush_delay = flush_delay
+        self.writes = 0
+        self._ready = False
+        self._pending = {}
+        self._handle = None
+
+    async def _prepare(self):
+        if not self._ready:
+            await self.db.executescript(SCHEMA)
+            self._ready = True
+
+    def add(self, items):
+        for item in items:
+            row = item_row(item)
+            if row is not None:
+                self._pending[row[0]] = row
+
+        if self._pending and self._handle is None:
+            loop = asyncio.get_event_loop()
+            self._handle = loop.call_later(self.flush_delay, lambda: asyncio.ensure_future(self.flush()))
+
+    async def flush(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+        pending, self._pending = self._pending, {}
+        if pending:
+            await self._prepare()
+            await self.db.executemany(UPSERT, list(pending.values()))
+            self.writes += len(pending)
+
+    async def search(self, text, *, kind=None, limit=10):
+        """Returns up to limit (kind, item_id, title) tuples, best match first."""
+
+        expression = match_expression(text)
+        if expression is None:
+            return []
+
+        await self._prepare()
+        return await self.db.fetchall(SEARCH, expression, kind, kind, limit)
+
+    async def count(self):
+        await self._prepare()
+        row = await self.db.fetchone('SELECT COUNT(*) FROM items')
+        return row[0]
+
+    async def close(self):
+        await self.flush()
+        await self.db.close()
@@ -0,0 +1,150 @@
+import asyncio
+from bisect import bisect_left
+
+from aiohttp import web
+
+# seconds, from a cached reply up to a slow multi-page search
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# how often the event loop is checked for lag
+LAG_INTERVAL = 0.5
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra is not None:
+        pairs.append(f'le="{extra}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values = {}
+
+    def inc(self, *labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def lines(self):
+        for labels, value in self.values.items():
+            yield f'{self.name}{_labels(self.labels, labels)} {value}'
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> [count per bucket with +Inf last, sum]
+        self.values = {}
+
+    def observe(self, value, *labels):
+        series = self.values.get(labels)
+        if series is None:
+            series = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def lines(self):
+        for labels, (counts, total) in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                yield f'{self.name}_bucket{_labels(self.labels, labels, bound)} {cumulative}'
+
+            yield f'{self.name}_sum{_labels(self.labels, labels)} {total}'
+            yield f'{self.name}_count{_labels(self.labels, labels)} {cumulative}'
+
+
+class Callback:
+    """A metric read from existing state when scraped instead of being recorded."""
+
+    def __init__(self, name, help, func, labels=(), kind='gauge'):
+        self.name = name
+        self.help = help
+        self.func = func
+        self.labels = labels
+        self.kind = kind
+
+    def lines(self):
+        value = self.func()
+        if not isinstance(value, dict):
+            value = {(): value}
+
+        for labels, value in value.items():
+            yield f'{self.name}{_labels(self.labels, labels)} {value}'
+
+
+class Metrics:
+    def __init__(self):
+        self._metrics = {}
+
+    def _register(self, cls, name, *args, **kwargs):
+        # reloaded cogs keep counting where they left off
+        metric = self._metrics.get(name)
+        if not isinstance(metric, cls):
+            metric = self._metrics[name] = cls(name, *args, **kwargs)
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self._register(Counter, name, help, labels)
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, help, labels, buckets)
+
+    def callback(self, name, help, func, labels=(), kind='gauge'):
+        # callbacks are bound to whoever registered them last
+        metric = self._metrics[name] = Callback(name, help, func, labels, kind)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.lines())
+
+        return '\n'.join(lines) + '\n'
+
+
+async def sample_lag(loop, histogram, interval=LAG_INTERVAL):
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        histogram.observe(max(0.0, loop.time() - start - interval))
+
+
+class MetricsServer:
+    def __init__(self, metrics, *, host='127.0.0.1', port=9100):
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self._runner = None
+
+        self.app = web.Application()
+        self.app.router.add_get('/metrics', self.scrape)
+
+    async def start(self):
+        self._runner = web.AppRunner(self.app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+
+    async def close(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    async def scrape(self, request):
+        return web.Response(text=self.metrics.render(), content_type='text/plain')
@@ -0,0 +1,50 @@
+import sys
+import time
+import asyncio
+import threading
+import traceback
+
+
+class LoopMonitor:
+    """Watches the event loop from another thread and prints what it was running when it stalls."""
+
+    def __init__(self, loop, *, threshold=0.25, interval=0.1):
+        self.loop = loop
+        self.threshold = threshold
+        self.interval = interval
+        self.stalls = 0
+        self._beat = time.monotonic()
+        self._loop_thread = None
+        self._task = None
+        self._stopped = threading.Event()
+
+    def start(self):
+        # has to be called from the loop's thread so we know which stack to look at
+        self._loop_thread = threading.get_ident()
+        self._task = self.loop.create_task(self.heartbeat())
+        threading.Thread(target=self.watch, name='loop-monitor', daemon=True).start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+
+    async def heartbeat(self):
+        while True:
+            self._beat = time.monotonic()
+            await asyncio.sleep(self.interval)
+
+    def watch(self):
+        reported = None
+        while not self._stopped.wait(self.interval):
+            beat = self._beat
+            blocked = time.monotonic() - beat - self.interval
+            if blocked < self.threshold or beat == reported:
+                continue
+
+            # one report per stall, taken while the loop is still stuck in it
+            reported = beat
+            self.stalls += 1
+            frame = sys._current_frames().get(self._loop_thread)
+            stack = ''.join(traceback.format_stack(frame)) if frame is not None else ''
+            print(f'Event loop blocked for at least {blocked:.2f}s in:\n{stack}', file=sys.stderr)
@@ -1,4 +1,5 @@
 import asyncio
+import heapq
 
 import discord
 
@@ -8,12 +9,24 @@ class CannotPaginate(Exception):
 
 
 class Paginator:
-    def __init__(self, ctx, *, entries):
+    def __init__(self, ctx, *, entries, source=None, total=None, prefetch=5, edit_delay=0.25):
+        self.ctx = ctx
         self.bot = ctx.bot
         self.entries = entries
         self.channel = ctx.channel
         self.author = ctx.author
-        self.maximum_pages = len(entries)
+
+        # source is an async iterator yielding more lists of entries on demand
+        self.source = source
+        self.total = len(entries) if source is None else max(total or 0, len(entries))
+        self.prefetch = prefetch
+        self.maximum_pages = self.count_pages(self.total)
+        self._loading = asyncio.Lock()
+
+        # rapid page changes collapse into one edit showing the last page
+        self.edit_delay = edit_delay
+        self._next_edit = None
+        self._editing = None
 
         self.reaction_emojis = {
             '\N{BLACK LEFT-POINTING DOUBLE TRIANGLE WITH VERTICAL BAR}': self.first_page,
@@ -38,28 +51,70 @@ class Paginator:
 
     @property
     def paginating(self):
-        return len(self.entries) > 1
+        return self.total > 1
+
+    def count_pages(self, count):
+        return count
+
+    def entries_needed(self, page):
+        return page
+
+    async def load_entries(self, count):
+        async with self._loading:
+            while self.source is not None and len(self.entries) < count:
+                try:
+                    entries = await self.source.__anext__()
+                except Exception:
+                    # running out or failing both just mean there is nothing more to show
+                    self.source = None
+                    self.total = len(self.entries)
+                    self.maximum_pages = self.count_pages(self.total)
+                else:
+                    self.entries.extend(entries)
+
+    async def load_page(self, page):
+        await self.load_entries(self.entries_needed(page))
+        if self.source is not None:
+            needed = self.entries_needed(page + self.prefetch)
+            if len(self.entries) < needed:
+                self.bot.loop.create_task(self.load_entries(needed))
+
+        return min(page, self.maximum_pages)
 
     async def show_page(self, page, *, first=False):
         if not self.paginating:
             return await self.channel.send(self.entries[0])
 
+        page = await self.load_page(page)
         self.current_page = page
 
         if not first:
             content = f'[{page}/{self.maximum_pages}]\n{self.entries[page - 1]}'
-            return await self.message.edit(content=content)
+            return self.edit_message(content=content)
 
         content = f'[{page}/{self.maximum_pages}]\n{self.entries[0]}'
         self.message = await self.channel.send(content)
-        await self.add_reactions()
+        self.bot.loop.create_task(self.add_reactions())
 
     async def add_reactions(self):
-        for reaction in self.reaction_emojis:
-            if self.maximum_pages == 2 and reaction in ('\u23ed', '\u23ee'):
-                continue
-
-            await self.message.add_reaction(reaction)
+        # discord.py queues requests per rate limit bucket in order, so they still show up in order
+        reactions = [self.message.add_reaction(reaction) for reaction in self.reaction_emojis
+                     if not (self.maximum_pages == 2 and reaction in ('\u23ed', '\u23ee'))]
+        await asyncio.gather(*reactions)
+
+    def edit_message(self, **fields):
+        self._next_edit = fields
+        if self._editing is None or self._editing.done():
+            self._editing = self.bot.loop.create_task(self.flush_edits())
+
+    async def flush_edits(self):
+        await asyncio.sleep(self.edit_delay)
+        while self._next_edit is not None:
+            fields, self._next_edit = self._next_edit, None
+            try:
+                await self.message.edit(**fields)
+            except discord.HTTPException:
+                pass
 
     async def checked_show_page(self, page):
         if 0 < page <= self.maximum_pages:
@@ -115,58 +170,63 @@ class Paginator:
         return reaction.emoji in self.reaction_emojis
 
     async def paginate(self):
-        first_page = self.show_page(1, first=True)
-        if not self.paginating:
-            await first_page
-        else:
-            self.bot.loop.create_task(first_page)
+        await self.show_page(1, first=True)
+        self.ctx.responded()
 
-        while self.paginating:
-            try:
-                wait_for = self.bot.wait_for('reaction_add', check=self.check, timeout=120.0)
-                reaction, user = await wait_for
-            except asyncio.TimeoutError:
+        try:
+            while self.paginating:
                 try:
-                    await self.message.clear_reactions()
-                finally:
-                    break
+                    reaction, user = await self.bot.paginators.wait(self, timeout=120.0)
+                except asyncio.TimeoutError:
+                    try:
+                        await self.message.clear_reactions()
+                    finally:
+                        break
 
-            try:
-                await self.message.remove_reaction(reaction, user)
-            except:
-                pass
+                try:
+                    await self.message.remove_reaction(reaction, user)
+                except:
+                    pass
 
-            func = self.reaction_emojis.get(reaction.emoji)
-            await func()
-            if func is self.stop_pages:
-                break
+                func = self.reaction_emojis.get(reaction.emoji)
+                await func()
+                if func is self.stop_pages:
+                    break
+        finally:
+            if self.paginating:
+                self.bot.paginators.discard(self)
 
 
 class EmbedPaginator(Paginator):
-    def __init__(self, ctx, *, entries, per_page=10):
+    def __init__(self, ctx, *, entries, per_page=10, **kwargs):
         self.per_page = per_page
-        super().__init__(ctx, entries=entries)
-
-        pages, left_over = divmod(len(entries), per_page)
-        if left_over:
-            pages += 1
-        self.maximum_pages = pages
+        super().__init__(ctx, entries=entries, **kwargs)
         self.embed = discord.Embed()
 
     @property
     def paginating(self):
-        return len(self.entries) > self.per_page
+        return self.total > self.per_page
+
+    def count_pages(self, count):
+        pages, left_over = divmod(count, self.per_page)
+        if left_over:
+            pages += 1
+        return pages
+
+    def entries_needed(self, page):
+        return page * self.per_page
 
     def get_page(self, page):
         base = (page - 1) * self.per_page
         return self.entries[base:base + self.per_page]
 
     async def show_page(self, page, *, first=False):
+        page = await self.load_page(page)
         self.current_page = page
         entries = self.get_page(page)
 
         if self.maximum_pages > 1:
-            text = f'Page {page}/{self.maximum_pages} ({len(self.entries)} entries)'
+            text = f'Page {page}/{self.maximum_pages} ({self.total} entries)'
             self.embed.set_footer(text=text)
 
         self.embed.description = '\n'.join(entries)
@@ -175,7 +235,82 @@ class EmbedPaginator(Paginator):
             return await self.channel.send(embed=self.embed)
 
         if not first:
-            return await self.message.edit(embed=self.embed)
+            return self.edit_message(embed=self.embed)
 
         self.message = await self.channel.send(embed=self.embed)
-        await self.add_reactions()
+        self.bot.loop.create_task(self.add_reactions())
+
+
+class PaginatorManager:
+    def __init__(self, loop):
+        self.loop = loop
+        self.routed = 0
+        self._sessions = {}
+        self._deadlines = []
+        self._timer = None
+        self._timer_at = None
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def wait(self, paginator, *, timeout):
+        fut = self.loop.create_future()
+        deadline = self.loop.time() + timeout
+        message_id = paginator.message.id
+        self._sessions[message_id] = (paginator, fut, deadline)
+
+        heapq.heappush(self._deadlines, (deadline, message_id))
+        self._schedule()
+        return fut
+
+    def discard(self, paginator):
+        session = self._sessions.get(paginator.message.id)
+        if session is not None and session[0] is paginator:
+            del self._sessions[paginator.message.id]
+
+    def dispatch(self, reaction, user):
+        session = self._sessions.get(reaction.message.id)
+        if session is None:
+            return False
+
+        paginator, fut, _ = session
+        if fut.done() or not paginator.check(reaction, user):
+            return False
+
+        # the paginator waits again once it has handled the reaction
+        del self._sessions[reaction.message.id]
+        self.routed += 1
+        fut.set_result((reaction, user))
+        return True
+
+    def _schedule(self):
+        if not self._deadlines:
+            return
+
+        deadline = self._deadlines[0][0]
+        if self._timer is not None:
+            if self._timer_at <= deadline:
+                return
+            self._timer.cancel()
+
+        self._timer = self.loop.call_at(deadline, self._expire)
+        self._timer_at = deadline
+
+    def _expire(self):
+        self._timer = None
+        now = self.loop.time()
+
+        while self._deadlines and self._deadlines[0][0] <= now:
+            deadline, message_id = heapq.heappop(self._deadlines)
+            session = self._sessions.get(message_id)
+
+            # entries left behind by a session that waited again are skipped
+            if session is None or session[2] != deadline:
+                continue
+
+            del self._sessions[message_id]
+            fut = session[1]
+            if not fut.done():
+                fut.set_exception(asyncio.TimeoutError())
+
+        self._schedule()
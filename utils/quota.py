@@ -0,0 +1,230 @@
+import asyncio
+import enum
+import heapq
+import itertools
+import time
+from collections import deque, Counter
+
+from discord.ext import commands
+
+from .time import human_time
+
+# units charged by the YouTube Data API per call, anything not listed costs 1
+QUOTA_COSTS = {
+    'search': 100,
+    'videos': 1,
+    'channels': 1,
+    'playlists': 1,
+    'playlistItems': 1,
+}
+
+QUOTA_WINDOW = 24 * 60 * 60
+
+
+class Priority(enum.IntEnum):
+    INFO = 0
+    SEARCH = 1
+    BULK = 2
+
+
+# fraction of the daily budget a priority is not allowed to dip into
+DEFAULT_RESERVES = {
+    Priority.INFO: 0.0,
+    Priority.SEARCH: 0.1,
+    Priority.BULK: 0.3,
+}
+
+
+class QuotaExceeded(commands.CommandError):
+    def __init__(self, retry_after, message='The YouTube quota is running low'):
+        self.retry_after = retry_after
+        super().__init__(f'{message}, try again in {human_time(max(retry_after, 1))}.')
+
+
+class BudgetExhausted(QuotaExceeded):
+    def __init__(self, retry_after, *, guild=False):
+        whose = "This server's" if guild else 'Your'
+        super().__init__(retry_after, f'{whose} YouTube budget is exhausted')
+
+
+class QuotaScheduler:
+    def __init__(self, *, daily_budget=10000, concurrency=8, costs=None, reserves=None, max_defer=30.0,
+                 shared=None):
+        self.daily_budget = daily_budget
+        self.concurrency = concurrency
+        self.costs = costs or QUOTA_COSTS
+        self.reserves = reserves or DEFAULT_RESERVES
+        self.max_defer = max_defer
+        # anything with an async reserve(units, priority) returning a delay, e.g. a cluster client
+        self.shared = shared
+        self.spent = 0
+        self.refused = 0
+        self._history = deque()
+        self._active = 0
+        self._waiters = []
+        self._counter = itertools.count()
+
+    @property
+    def remaining(self):
+        self._expire()
+        return self.daily_budget - self.spent
+
+    @property
+    def queued(self):
+        return sum(not fut.done() for *_, fut in self._waiters)
+
+    def cost(self, route):
+        return self.costs.get(route, 1)
+
+    def _expire(self):
+        cutoff = time.time() - QUOTA_WINDOW
+        history = self._history
+        while history and history[0][0] < cutoff:
+            _, units = history.popleft()
+            self.spent -= units
+
+    def retry_after(self, units, priority):
+        self._expire()
+        allowed = self.daily_budget * (1 - self.reserves[priority])
+        needed = self.spent + units - allowed
+        if needed <= 0:
+            return 0.0
+
+        freed = 0
+        for timestamp, spent in self._history:
+            freed += spent
+            if freed >= needed:
+                return max(0.0, timestamp + QUOTA_WINDOW - time.time())
+
+        return float(QUOTA_WINDOW)
+
+    async def _wait_for_slot(self, priority):
+        if self._active < self.concurrency and not self._waiters:
+            self._active += 1
+            return
+
+        fut = asyncio.get_event_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._counter), fut))
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                self.release()
+            raise
+
+    async def acquire(self, route, priority=Priority.INFO):
+        units = self.cost(route)
+
+        while True:
+            delay = self.retry_after(units, priority)
+            if delay > self.max_defer:
+                self.refused += 1
+                raise QuotaExceeded(delay)
+
+            if delay:
+                await asyncio.sleep(delay)
+                continue
+
+            await self._wait_for_slot(priority)
+
+            # the budget may have moved on while we were queued
+            if self.retry_after(units, priority):
+                self.release()
+                continue
+
+            if self.shared is not None:
+                try:
+                    delay = await self.shared.reserve(units, priority)
+                except asyncio.CancelledError:
+                    self.release()
+                    raise
+
+                if delay:
+                    self.release()
+                    if delay > self.max_defer:
+                        self.refused += 1
+                        raise QuotaExceeded(delay)
+                    await asyncio.sleep(delay)
+                    continue
+
+            self.record(units)
+            return units
+
+    def record(self, units):
+        self._history.append((time.time(), units))
+        self.spent += units
+
+    def release(self):
+        while self._waiters:
+            *_, fut = heapq.heappop(self._waiters)
+            if not fut.done():
+                fut.set_result(None)
+                return
+
+        self._active -= 1
+
+
+class QuotaLedger:
+    def __init__(self, scheduler, *, guild_budget=2000, user_budget=500, weights=None,
+                 tight=0.25, active_window=60 * 60):
+        self.scheduler = scheduler
+        self.guild_budget = guild_budget
+        self.user_budget = user_budget
+        self.weights = weights or {}
+        self.tight = tight
+        self.active_window = active_window
+        self.guild_spent = Counter()
+        self.user_spent = Counter()
+
+        # id -> [tokens, last refill], refilled to capacity once per quota window
+        self._guilds = {}
+        self._users = {}
+
+    def weight(self, guild_id):
+        return self.weights.get(guild_id, 1)
+
+    def _bucket(self, buckets, key, capacity, now):
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = [capacity, now]
+        else:
+            bucket[0] = min(capacity, bucket[0] + (now - bucket[1]) * capacity / QUOTA_WINDOW)
+            bucket[1] = now
+        return bucket
+
+    def guild_capacity(self, guild_id, now):
+        capacity = self.guild_budget * self.weight(guild_id)
+        remaining = self.scheduler.remaining
+        if remaining >= self.scheduler.daily_budget * self.tight:
+            return capacity
+
+        # when the shared budget runs low, the guilds using it split what is left by weight
+        cutoff = now - self.active_window
+        active = sum(self.weight(key) for key, (_, updated) in self._guilds.items()
+                     if updated >= cutoff and key != guild_id)
+        weight = self.weight(guild_id)
+        return min(capacity, remaining * weight / (active + weight))
+
+    def check(self, ctx, units, *, charge=False):
+        now = time.time()
+
+        user = self._bucket(self._users, ctx.author.id, self.user_budget, now)
+        if user[0] < units:
+            raise BudgetExhausted((units - user[0]) * QUOTA_WINDOW / self.user_budget)
+
+        guild = None
+        if ctx.guild is not None:
+            capacity = self.guild_capacity(ctx.guild.id, now)
+            guild = self._bucket(self._guilds, ctx.guild.id, capacity, now)
+            if guild[0] < units:
+                raise BudgetExhausted((units - guild[0]) * QUOTA_WINDOW / max(capacity, 1), guild=True)
+
+        if charge:
+            user[0] -= units
+            self.user_spent[ctx.author.id] += units
+            if guild is not None:
+                guild[0] -= units
+                self.guild_spent[ctx.guild.id] += units
+
+    def charge(self, ctx, units):
+        self.check(ctx, units, charge=True)
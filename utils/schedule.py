@@ -0,0 +1,49 @@
+import time
+import heapq
+import asyncio
+
+
+class DueQueue:
+    def __init__(self):
+        self._heap = []
+        self._when = {}
+        self._wakeup = asyncio.Event()
+
+    def __len__(self):
+        return len(self._when)
+
+    def __contains__(self, key):
+        return key in self._when
+
+    def schedule(self, key, when):
+        self._when[key] = when
+        heapq.heappush(self._heap, (when, key))
+        self._wakeup.set()
+
+    def discard(self, key):
+        self._when.pop(key, None)
+
+    def pop_due(self, limit, *, slack=0.0):
+        """Pops up to limit due keys, and once one is due, also the keys due within slack seconds."""
+
+        now = time.time()
+        cutoff = now
+        due = []
+        while self._heap and self._heap[0][0] <= cutoff and len(due) < limit:
+            when, key = heapq.heappop(self._heap)
+
+            # entries for discarded or rescheduled keys are left behind in the heap
+            if self._when.get(key) == when:
+                del self._when[key]
+                due.append(key)
+                cutoff = now + slack
+
+        return due
+
+    async def wait(self):
+        timeout = self._heap[0][0] - time.time() if self._heap else None
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
@@ -0,0 +1,40 @@
+import json
+
+import aiohttp
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Google only compresses responses for user agents that mention gzip
+API_HEADERS = {
+    'Accept-Encoding': 'gzip',
+    'User-Agent': 'YouTubeBot (gzip)',
+}
+
+# most of the traffic goes to a single host, so it gets most of the pool
+CONNECTION_LIMIT = 100
+CONNECTIONS_PER_HOST = 32
+KEEPALIVE_TIMEOUT = 60
+DNS_CACHE_TTL = 10 * 60
+
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+
+def make_session(loop):
+    connector = aiohttp.TCPConnector(limit=CONNECTION_LIMIT, limit_per_host=CONNECTIONS_PER_HOST,
+                                     keepalive_timeout=KEEPALIVE_TIMEOUT,
+                                     use_dns_cache=True, ttl_dns_cache=DNS_CACHE_TTL, loop=loop)
+    return aiohttp.ClientSession(loop=loop, connector=connector)
+
+
+# orjson is optional and only changes how fast responses are decoded
+if orjson is not None:
+    loads = orjson.loads
+    dumps = orjson.dumps
+else:
+    loads = json.loads
+
+    def dumps(data):
+        return json.dumps(data).encode('utf8')
@@ -0,0 +1,178 @@
+import hmac
+import time
+import asyncio
+import hashlib
+import secrets
+from collections import OrderedDict, namedtuple
+from xml.etree import ElementTree
+
+import aiohttp
+from aiohttp import web
+
+HUB_URL = 'https://pubsubhubbub.appspot.com/subscribe'
+TOPIC_BASE = 'https://www.youtube.com/xml/feeds/videos.xml?channel_id='
+
+ATOM = '{http://www.w3.org/2005/Atom}'
+YT = '{http://www.youtube.com/xml/schemas/2015}'
+
+# how often leases are checked, how long before expiry they are renewed
+# and how long a subscription may stay unverified before it is requested again
+RENEW_INTERVAL = 5 * 60
+RENEW_MARGIN = 60 * 60
+PENDING_TIMEOUT = 10 * 60
+
+Entry = namedtuple('Entry', 'video_id channel_id title author published updated')
+
+
+def parse_feed(body):
+    root = ElementTree.fromstring(body)
+    entries = []
+    for entry in root.iter(ATOM + 'entry'):
+        entries.append(Entry(
+            video_id=entry.findtext(YT + 'videoId'),
+            channel_id=entry.findtext(YT + 'channelId'),
+            title=entry.findtext(ATOM + 'title'),
+            author=entry.findtext(f'{ATOM}author/{ATOM}name'),
+            published=entry.findtext(ATOM + 'published') or '',
+            updated=entry.findtext(ATOM + 'updated') or '',
+        ))
+
+    return entries
+
+
+class WebSubServer:
+    def __init__(self, bot, *, callback_url, host='0.0.0.0', port=8080, hub=HUB_URL,
+                 secret=None, lease_seconds=5 * 24 * 60 * 60, recent_limit=4096):
+        self.bot = bot
+        self.callback_url = callback_url
+        self.host = host
+        self.port = port
+        self.hub = hub
+        self.secret = secret or secrets.token_hex(16)
+        self.lease_seconds = lease_seconds
+        self.recent_limit = recent_limit
+
+        self.topics = set()
+        self.leases = {}
+        self.received = 0
+        self.duplicates = 0
+        self._requested = {}
+        self._recent = OrderedDict()
+        self._runner = None
+        self._renewer = None
+
+        self.app = web.Application()
+        self.app.router.add_get('/', self.verify)
+        self.app.router.add_post('/', self.receive)
+
+    async def start(self):
+        self._runner = web.AppRunner(self.app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self._renewer = self.bot.loop.create_task(self.renew_loop())
+
+    async def close(self):
+        if self._renewer is not None:
+            self._renewer.cancel()
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    def is_subscribed(self, channel_id):
+        return self.leases.get(TOPIC_BASE + channel_id, 0) > time.time()
+
+    async def subscribe(self, channel_id):
+        topic = TOPIC_BASE + channel_id
+        self.topics.add(topic)
+        return await self.request('subscribe', topic)
+
+    async def unsubscribe(self, channel_id):
+        topic = TOPIC_BASE + channel_id
+        self.topics.discard(topic)
+        self.leases.pop(topic, None)
+        return await self.request('unsubscribe', topic)
+
+    async def request(self, mode, topic):
+        data = {
+            'hub.mode': mode,
+            'hub.topic': topic,
+            'hub.callback': self.callback_url,
+            'hub.verify': 'async',
+            'hub.lease_seconds': str(self.lease_seconds),
+            'hub.secret': self.secret,
+        }
+
+        self._requested[topic] = time.time()
+        async with self.bot.session.post(self.hub, data=data) as r:
+            return r.status in (202, 204)
+
+    async def verify(self, request):
+        mode = request.query.get('hub.mode')
+        topic = request.query.get('hub.topic')
+        challenge = request.query.get('hub.challenge', '')
+
+        if mode == 'subscribe' and topic in self.topics:
+            lease_seconds = int(request.query.get('hub.lease_seconds', self.lease_seconds))
+            self.leases[topic] = time.time() + lease_seconds
+            self._requested.pop(topic, None)
+            return web.Response(text=challenge)
+
+        if mode == 'unsubscribe' and topic not in self.topics:
+            self._requested.pop(topic, None)
+            return web.Response(text=challenge)
+
+        if mode == 'denied':
+            self.leases.pop(topic, None)
+            return web.Response()
+
+        return web.Response(status=404)
+
+    async def receive(self, request):
+        body = await request.read()
+
+        # unsigned or forged notifications are acknowledged but ignored, as the spec asks
+        signature = request.headers.get('X-Hub-Signature', '')
+        expected = 'sha1=' + hmac.new(self.secret.encode(), body, hashlib.sha1).hexdigest()
+        if not hmac.compare_digest(signature, expected):
+            return web.Response(status=204)
+
+        try:
+            entries = await self.bot.loop.run_in_executor(None, parse_feed, body)
+        except ElementTree.ParseError:
+            return web.Response(status=400)
+
+        for entry in entries:
+            self.received += 1
+            if entry.video_id is None:
+                continue
+
+            # YouTube pushes again whenever a video's metadata is edited
+            if entry.video_id in self._recent:
+                self.duplicates += 1
+                continue
+
+            self._recent[entry.video_id] = None
+            if len(self._recent) > self.recent_limit:
+                self._recent.popitem(last=False)
+
+            self.bot.dispatch('websub_entry', entry)
+
+        return web.Response(status=204)
+
+    def needs_renewal(self, topic, now):
+        expires = self.leases.get(topic)
+        if expires is not None:
+            return expires - now < RENEW_MARGIN
+
+        return now - self._requested.get(topic, 0) > PENDING_TIMEOUT
+
+    async def renew_loop(self):
+        while True:
+            await asyncio.sleep(RENEW_INTERVAL)
+
+            now = time.time()
+            for topic in [topic for topic in self.topics if self.needs_renewal(topic, now)]:
+                try:
+                    await self.request('subscribe', topic)
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    pass